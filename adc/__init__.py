@@ -0,0 +1 @@
+"""Moteur de l'Atelier de Compréhension (ADC), hors interface Streamlit."""
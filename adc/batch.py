@@ -0,0 +1,150 @@
+"""Génération en lot : une fiche par texte et par niveau, sans interface.
+
+    python -m adc.batch textes/ --out fiches/ --cycles "Cycle 2" "Cycle 3"
+    python -m adc.batch textes/ --backend stub  # essai sans appel à Gemini
+
+Les fiches déjà écrites sont sautées : une reprise après interruption ne
+refait que ce qui manque. Deux textes de même nom (conte.docx et conte.jpg)
+ont des fiches distinctes : l'extension entre alors dans leur nom.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from adc.cache import FicheCache
+from adc.context import ContextCache
+from adc.extraction import DOCX_MIME, PDF_MIME, IngestionBudget
+from adc.models import BACKENDS, DEFAULT_MODEL, make_model
+from adc.pipeline import cached_fiches, prepare_source
+from adc.scheduler import ModelScheduler, ScheduledModel
+
+MIME_TYPES = {
+    ".pdf": PDF_MIME,
+    ".docx": DOCX_MIME,
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+}
+CYCLES = ("Cycle 2", "Cycle 3")
+
+
+def output_name(path, cycle_short, with_extension=False):
+    stem, extension = os.path.splitext(os.path.basename(path))
+    if with_extension:
+        stem = f"{stem}_{extension.lstrip('.')}"
+    return f"Fiche_ADC_{stem}_{cycle_short.replace(' ', '_')}.docx"
+
+
+def _stem(path):
+    return os.path.splitext(os.path.basename(path))[0].lower()
+
+
+def find_sources(source_dir):
+    return sorted(
+        os.path.join(source_dir, name) for name in os.listdir(source_dir)
+        if os.path.splitext(name)[1].lower() in MIME_TYPES
+    )
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def process_file(path, out_dir, cycles, get_model, cache, model_name, contexts=None, with_extension=False):
+    """Extrait le texte une fois puis écrit, en parallèle, la fiche de chaque niveau manquant.
+
+    Avec `contexts`, le texte support n'est envoyé qu'une fois pour tous les niveaux.
+    `with_extension` : un autre texte du dossier porte le même nom (voir `output_name`).
+    """
+    todo = [c for c in cycles if not os.path.exists(os.path.join(out_dir, output_name(path, c, with_extension)))]
+    results = [(path, c, "déjà faite") for c in cycles if c not in todo]
+    if not todo:
+        return results
+
+    with open(path, "rb") as f:
+        file_bytes = f.read()
+    mime_type = MIME_TYPES[os.path.splitext(path)[1].lower()]
+    source = prepare_source(file_bytes, mime_type, budget=IngestionBudget(), contexts=contexts)
+    del file_bytes
+
+    for cycle_short, (_, docx_bytes, hit) in cached_fiches(get_model, source, todo, cache, model_name).items():
+        _write_atomic(os.path.join(out_dir, output_name(path, cycle_short, with_extension)), docx_bytes)
+        results.append((path, cycle_short, "cache" if hit else "générée"))
+    return results
+
+
+def run_batch(source_dir, out_dir, model, cycles=CYCLES, model_name=DEFAULT_MODEL,
+              concurrency=4, per_minute=60, cache=None, log=print, context_ttl=900):
+    """Traite tout le dossier ; renvoie [(fichier, niveau, statut)], statut « erreur : … » en cas d'échec.
+
+    `model` : modèle à appeler, par exemple `make_model("gemini", api_key)` ou
+    `make_model("stub")` (adc.models).
+    """
+    if not hasattr(model, "generate_content"):
+        raise TypeError("run_batch : `model` doit être un modèle (adc.models.make_model), pas "
+                        f"{type(model).__name__}")
+    os.makedirs(out_dir, exist_ok=True)
+    cache = cache or FicheCache(os.path.join(out_dir, ".adc_cache"))
+    # File sans plafond : en lot, tout attend son tour plutôt que d'échouer
+    scheduler = ModelScheduler(requests_per_minute=per_minute, max_concurrent=concurrency, max_queue=0)
+    scheduled = ScheduledModel(model, scheduler)
+    contexts = ContextCache(model, context_ttl, scheduler=scheduler) if context_ttl else None
+
+    sources = find_sources(source_dir)
+    # Même nom, extensions différentes : sans l'extension, leurs fiches se confondraient
+    stems = Counter(_stem(path) for path in sources)
+
+    def task(path):
+        try:
+            return process_file(path, out_dir, cycles, lambda: scheduled, cache, model_name, contexts,
+                                with_extension=stems[_stem(path)] > 1)
+        except Exception as e:
+            return [(path, c, f"erreur : {e}") for c in cycles]
+
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for file_results in executor.map(task, sources):
+            for path, cycle_short, status in file_results:
+                log(f"{os.path.basename(path)} — {cycle_short} : {status}")
+            results.extend(file_results)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère les fiches ADC d'un dossier de textes.")
+    parser.add_argument("source_dir", help="dossier de textes (PDF, Word, JPG, PNG)")
+    parser.add_argument("--out", default="fiches", help="dossier des fiches .docx (défaut : fiches)")
+    parser.add_argument("--cycles", nargs="+", default=list(CYCLES), choices=CYCLES)
+    parser.add_argument("--concurrency", type=int, default=4, help="appels au modèle simultanés")
+    parser.add_argument("--rpm", type=int, default=60, help="requêtes par minute au maximum")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--context-ttl", type=int, default=900,
+                        help="durée (s) du texte support dans le cache de contexte, 0 pour désactiver")
+    parser.add_argument("--backend", default="gemini", choices=sorted(BACKENDS),
+                        help="stub : modèle factice local, sans appel réseau")
+    parser.add_argument("--mock", action="store_const", const="stub", dest="backend",
+                        help="équivaut à --backend stub")
+    args = parser.parse_args(argv)
+
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if args.backend == "gemini" and not api_key:
+        parser.error("la variable d'environnement GEMINI_API_KEY est manquante (ou utilisez --backend stub)")
+    model = make_model(args.backend, api_key, args.model)
+    # Les fiches factices ne partagent pas le cache des vraies
+    model_name = args.model if args.backend == "gemini" else f"{args.backend}:{args.model}"
+
+    results = run_batch(args.source_dir, args.out, model, args.cycles, model_name,
+                        args.concurrency, args.rpm, context_ttl=args.context_ttl)
+    failures = [r for r in results if r[2].startswith("erreur")]
+    print(f"{len(results) - len(failures)} fiche(s) prête(s), {len(failures)} échec(s).")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Cache disque des fiches générées, adressé par le contenu du texte support."""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import unicodedata
+
+
+# ── Normalisation du contenu avant hachage ──
+# Deux dépôts du même texte (réenregistré, espaces différents) doivent
+# tomber sur la même clé.
+def normalize_source(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    text = unicodedata.normalize("NFC", source)
+    return " ".join(text.split()).encode("utf-8")
+
+
+def fiche_key(sources, cycle_short, prompt_version, model_name):
+    h = hashlib.sha256()
+    for part in (cycle_short, prompt_version, model_name):
+        h.update(part.encode("utf-8") + b"\0")
+    for source in sources:
+        data = normalize_source(source)
+        h.update(str(len(data)).encode("ascii") + b"\0")
+        h.update(data)
+    return h.hexdigest()
+
+
+class FicheCache:
+    """Cache persistant (texte + .docx) avec éviction par âge et par taille.
+
+    Les requêtes identiques simultanées sont fusionnées : un seul appel au
+    modèle, les autres sessions attendent son résultat.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._inflight = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".json", base + ".docx"
+
+    def get(self, key):
+        meta_path, docx_path = self._paths(key)
+        try:
+            if time.time() - os.path.getmtime(meta_path) > self.max_age:
+                self._remove(key)
+                return None
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            docx_bytes = None
+            if meta.get("docx", True):
+                with open(docx_path, "rb") as f:
+                    docx_bytes = f.read()
+        except (OSError, ValueError):
+            return None
+        # Mise à jour de la date d'accès → éviction LRU
+        now = time.time()
+        for path in (meta_path, docx_path) if docx_bytes is not None else (meta_path,):
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        return meta["text"], docx_bytes
+
+    def put(self, key, text, docx_bytes=None):
+        # `docx_bytes` à None : entrée texte seule (analyse intermédiaire…)
+        meta_path, docx_path = self._paths(key)
+        # Écriture atomique : le .docx d'abord, le .json valide l'entrée
+        if docx_bytes is not None:
+            self._write_atomic(docx_path, docx_bytes)
+        payload = json.dumps({"text": text, "docx": docx_bytes is not None, "created": time.time()},
+                             ensure_ascii=False)
+        self._write_atomic(meta_path, payload.encode("utf-8"))
+        self.prune()
+
+    def get_or_compute(self, key, compute):
+        """Renvoie (texte, docx_bytes, hit) ; `compute()` → (texte, docx_bytes)."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached[0], cached[1], True
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = {"event": threading.Event(), "result": None, "error": None}
+                self._inflight[key] = flight
+
+        if not leader:
+            flight["event"].wait()
+            if flight["error"] is not None:
+                raise flight["error"]
+            text, docx_bytes = flight["result"]
+            return text, docx_bytes, True
+
+        try:
+            # Un appel concurrent a pu terminer entre la lecture et le verrou
+            cached = self.get(key)
+            if cached is not None:
+                flight["result"] = cached
+                return cached[0], cached[1], True
+            text, docx_bytes = compute()
+            self.put(key, text, docx_bytes)
+            flight["result"] = (text, docx_bytes)
+            return text, docx_bytes, False
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight["event"].set()
+
+    def prune(self):
+        entries = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-5]
+            meta_path, docx_path = self._paths(key)
+            try:
+                mtime = os.path.getmtime(meta_path)
+                size = os.path.getsize(meta_path)
+                if os.path.exists(docx_path):
+                    size += os.path.getsize(docx_path)
+            except OSError:
+                self._remove(key)
+                continue
+            if now - mtime > self.max_age:
+                self._remove(key)
+                continue
+            entries.append((mtime, size, key))
+            total += size
+
+        entries.sort()
+        while entries and total > self.max_bytes:
+            _, size, key = entries.pop(0)
+            self._remove(key)
+            total -= size
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _write_atomic(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
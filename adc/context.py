@@ -0,0 +1,107 @@
+"""Sessions de document : texte support déposé une fois chez le fournisseur du modèle.
+
+Sans session, chaque appel renvoie la consigne et tout le texte support —
+pour un livret scanné, des dizaines d'images de pages — même quand le même
+document est aussitôt repris pour l'autre niveau ou pour une section. Une
+session met le texte support dans le cache de contexte du fournisseur
+(`cache_context` du modèle, voir adc.models) ; les appels suivants n'envoient
+plus que la consigne et y font référence, jusqu'à expiration (TTL).
+"""
+import threading
+import time
+
+from adc.cache import fiche_key
+from adc.scheduler import estimate_prompt_tokens
+
+# Gemini refuse de mettre en cache un contexte plus court
+MIN_CONTEXT_TOKENS = 1024
+
+
+class DocumentSession:
+    """Texte support en cache chez le fournisseur ; `name` à None : dépôt impossible."""
+
+    def __init__(self, name, expires, tokens):
+        self.name = name
+        self.expires = expires
+        self.tokens = tokens
+
+
+class ContextCache:
+    """Sessions de document du processus, indexées par le contenu du texte support.
+
+    `client` : modèle brut (sous l'ordonnanceur) exposant `cache_context`.
+    `scheduler` (adc.scheduler.ModelScheduler) : si fourni, le dépôt passe par
+    sa file comme un appel au modèle — limite par minute, appels simultanés
+    et reprises compris — un livret scanné pesant autant qu'une requête. Une
+    session est rouverte `margin` secondes avant son expiration, pour qu'un
+    appel en cours ne la voie pas disparaître ; les ouvertures simultanées du
+    même document sont fusionnées. Un dépôt refusé n'est pas retenté avant
+    `ttl` : les appels envoient alors le texte support comme avant.
+    """
+
+    def __init__(self, client, ttl=900, min_tokens=MIN_CONTEXT_TOKENS, margin=60, scheduler=None):
+        self.client = client
+        self.scheduler = scheduler
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.margin = margin
+        self._sessions = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def open(self, source, trace=None):
+        """Session du texte support de `source` (PreparedSource), ou None s'il est envoyé tel quel."""
+        if not hasattr(self.client, "cache_context"):
+            return None
+        tokens = estimate_prompt_tokens(source.parts)
+        if tokens < self.min_tokens:
+            return None
+        key = fiche_key(source.sources, "", "context", "")
+
+        with self._lock:
+            now = time.time()
+            self._sessions = {k: s for k, s in self._sessions.items() if s.expires > now}
+            session = self._sessions.get(key)
+            if session is not None and session.expires - now > self.margin:
+                if trace is not None:
+                    trace.set("context", "reused" if session.name else "inline")
+                return session if session.name else None
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = {"event": threading.Event(), "session": None}
+                self._inflight[key] = flight
+
+        if not leader:
+            flight["event"].wait()
+            session = flight["session"]
+            if trace is not None:
+                trace.set("context", "reused" if session.name else "inline")
+            return session if session.name else None
+
+        started = time.perf_counter()
+        waited = []
+        try:
+            name = self._upload(source.parts, tokens, waited.append)
+        except Exception:
+            name = None
+        session = DocumentSession(name, time.time() + self.ttl, tokens)
+        if trace is not None:
+            # L'attente dans la file compte dans l'étape "queue", pas dans le dépôt
+            trace.add_time("queue", sum(waited))
+            trace.add_time("context", time.perf_counter() - started - sum(waited))
+            trace.set("context", "created" if name else "inline")
+        with self._lock:
+            self._sessions[key] = session
+            self._inflight.pop(key, None)
+        flight["session"] = session
+        flight["event"].set()
+        return session if name else None
+
+    def _upload(self, parts, tokens, on_wait):
+        def upload():
+            return self.client.cache_context(parts, self.ttl)
+
+        if self.scheduler is None:
+            return upload()
+        return self.scheduler.run(upload, tokens=tokens, on_wait=on_wait)
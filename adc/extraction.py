@@ -0,0 +1,291 @@
+"""Extraction du texte support (PDF, Word, image) en parties de prompt Gemini."""
+import io
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+# PyMuPDF, python-docx et Pillow sont importés dans les fonctions qui s'en
+# servent : l'interface démarre sans les charger (voir pipeline.warm_up).
+from adc.normalize import find_boilerplate, normalize_pages, normalize_text
+
+PDF_MIME = "application/pdf"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+SOURCE_INTRO = "Voici le texte support à analyser :\n\n"
+
+# Une page dont la couche texte fait moins de MIN_PAGE_CHARS caractères est
+# considérée comme scannée et envoyée en image.
+MIN_PAGE_CHARS = 20
+
+IMAGE_FORMATS = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+# Estimation Gemini : ~4 caractères par token, 258 tokens par tuile d'image 768×768
+CHARS_PER_TOKEN = 4
+IMAGE_TILE = 768
+TOKENS_PER_TILE = 258
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class BudgetExceeded(Exception):
+    """Le document dépasse un des plafonds d'ingestion ; le message est destiné à l'enseignant."""
+
+
+class IngestionBudget:
+    """Plafonds d'une ingestion : taille du fichier, nombre de pages, tokens envoyés."""
+
+    def __init__(self, max_bytes=20 * 1024 * 1024, max_pages=40, max_tokens=200_000):
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.max_tokens = max_tokens
+        self.tokens = 0
+
+    def check_bytes(self, size):
+        if self.max_bytes and size > self.max_bytes:
+            raise BudgetExceeded(
+                f"le fichier fait {size / 1024 / 1024:.1f} Mo, "
+                f"la limite est de {self.max_bytes / 1024 / 1024:.0f} Mo."
+            )
+
+    def check_pages(self, count):
+        if self.max_pages and count > self.max_pages:
+            raise BudgetExceeded(
+                f"le document compte {count} pages, la limite est de {self.max_pages} pages."
+            )
+
+    def add_tokens(self, count):
+        self.tokens += count
+        if self.max_tokens and self.tokens > self.max_tokens:
+            raise BudgetExceeded(
+                f"le texte dépasse la limite de {self.max_tokens} tokens envoyés au modèle. "
+                "Déposez un extrait plus court."
+            )
+
+
+def estimate_text_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_image_tokens(width, height):
+    return TOKENS_PER_TILE * math.ceil(width / IMAGE_TILE) * math.ceil(height / IMAGE_TILE)
+
+
+def _get_pool(workers):
+    # Pool de processus partagé : PyMuPDF n'est pas thread-safe et garde le
+    # GIL pendant le rendu, seuls des processus distincts rendent en parallèle.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _reset_pool(broken):
+    # Un processus du pool est mort (manque de mémoire sur une grande page…) :
+    # le pool est inutilisable, le suivant sera créé à la demande
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def encode_pixmap(pix, image_format="jpeg", quality=70):
+    if image_format == "png":
+        return pix.tobytes("png")
+    if image_format == "webp":
+        try:
+            from PIL import Image
+        except ImportError:
+            image_format = "jpeg"
+        else:
+            mode = "L" if pix.n == 1 else "RGB"
+            img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+            buffer = io.BytesIO()
+            img.save(buffer, "WEBP", quality=quality)
+            return buffer.getvalue()
+    return pix.tobytes("jpeg", jpg_quality=quality)
+
+
+def _render_pages(source, page_numbers, dpi, grayscale, image_format, quality):
+    import pymupdf
+
+    # `source` : octets du PDF, ou chemin d'un fichier temporaire côté pool
+    if isinstance(source, str):
+        pdf_doc = pymupdf.open(source)
+    else:
+        pdf_doc = pymupdf.open(stream=source, filetype="pdf")
+    colorspace = pymupdf.csGRAY if grayscale else pymupdf.csRGB
+    images = []
+    for number in page_numbers:
+        pix = pdf_doc.load_page(number).get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+        images.append((number, encode_pixmap(pix, image_format, quality), pix.width, pix.height))
+        pix = None  # libère le bitmap dès qu'il est encodé
+    pdf_doc.close()
+    return images
+
+
+def rasterize_pages(source, page_numbers, dpi=150, grayscale=True,
+                    image_format="jpeg", quality=70, workers=None):
+    """Rend les pages demandées en images compressées, en parallèle si utile.
+
+    Renvoie {numéro de page: (octets, largeur, hauteur)}.
+    """
+    workers = workers or min(4, os.cpu_count() or 1)
+    options = (dpi, grayscale, image_format, quality)
+    if workers <= 1 or len(page_numbers) <= 2:
+        rendered = _render_pages(source, page_numbers, *options)
+    else:
+        batches = [page_numbers[i::workers] for i in range(workers)]
+        for attempt in range(2):
+            pool = _get_pool(workers)
+            try:
+                futures = [pool.submit(_render_pages, source, batch, *options) for batch in batches if batch]
+                rendered = [image for future in futures for image in future.result()]
+                break
+            except BrokenProcessPool:
+                # Une seule reprise, dans un pool neuf
+                _reset_pool(pool)
+                if attempt:
+                    raise
+    return {number: (data, width, height) for number, data, width, height in rendered}
+
+
+def iter_pdf(file_bytes, budget=None, dpi=150, grayscale=True, image_format="jpeg",
+             quality=70, workers=None, report=None):
+    """Parcourt le PDF par fenêtres de pages et produit les parties au fil de l'eau.
+
+    Chaque page utilise sa couche texte si elle existe ; sinon elle est
+    rendue en image. Seule la fenêtre courante est gardée en mémoire.
+    Si `report` est un dict, il reçoit le nombre de pages, de pages
+    scannées et la durée du rendu en image.
+    """
+    import pymupdf
+
+    report = {} if report is None else report
+    budget = budget or IngestionBudget(max_bytes=0, max_pages=0, max_tokens=0)
+    workers = workers or min(4, os.cpu_count() or 1)
+    mime_type = IMAGE_FORMATS.get(image_format, "image/jpeg")
+    window = max(4, 2 * workers)
+
+    pdf_doc = pymupdf.open(stream=file_bytes, filetype="pdf")
+    budget.check_pages(len(pdf_doc))
+    report.update(pages=len(pdf_doc), scanned_pages=0, rasterize_seconds=0.0)
+    spill_path = None
+    try:
+        for start in range(0, len(pdf_doc), window):
+            numbers = range(start, min(start + window, len(pdf_doc)))
+            texts = {i: pdf_doc.load_page(i).get_text() for i in numbers}
+            scanned = [i for i in numbers if len(texts[i].strip()) < MIN_PAGE_CHARS]
+
+            images = {}
+            if scanned:
+                if spill_path is None and workers > 1 and len(scanned) > 2:
+                    # Le pool lit le PDF sur disque plutôt que d'en recevoir une
+                    # copie en mémoire à chaque lot.
+                    fd, spill_path = tempfile.mkstemp(suffix=".pdf")
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(file_bytes)
+                started = time.perf_counter()
+                images = rasterize_pages(spill_path or file_bytes, scanned, dpi, grayscale,
+                                         image_format, quality, workers)
+                report["rasterize_seconds"] += time.perf_counter() - started
+                report["scanned_pages"] += len(scanned)
+
+            for i in numbers:
+                if i in images:
+                    data, width, height = images.pop(i)
+                    budget.add_tokens(estimate_image_tokens(width, height))
+                    yield {"mime_type": mime_type, "data": data}
+                else:
+                    budget.add_tokens(estimate_text_tokens(texts[i]))
+                    yield texts[i]
+    finally:
+        pdf_doc.close()
+        if spill_path:
+            os.remove(spill_path)
+
+
+def iter_docx(file_bytes, budget=None):
+    from docx import Document
+
+    budget = budget or IngestionBudget(max_bytes=0, max_pages=0, max_tokens=0)
+    doc_in = Document(io.BytesIO(file_bytes))
+    for p in doc_in.paragraphs:
+        if p.text.strip():
+            budget.add_tokens(estimate_text_tokens(p.text) + 1)
+            yield p.text + "\n"
+
+
+def iter_image(file_bytes, mime_type, budget=None, **image_options):
+    from adc.images import preprocess_image
+
+    budget = budget or IngestionBudget(max_bytes=0, max_pages=0, max_tokens=0)
+    try:
+        data, mime_type, width, height = preprocess_image(file_bytes, **image_options)
+    except Exception:
+        # Image illisible par Pillow : on transmet l'original tel quel
+        data, width, height = file_bytes, 2 * IMAGE_TILE, 2 * IMAGE_TILE
+    budget.add_tokens(estimate_image_tokens(width, height))
+    yield {"mime_type": mime_type, "data": data}
+
+
+def iter_source(file_bytes, mime_type, budget=None, image_options=None, report=None, **pdf_options):
+    if budget is not None:
+        budget.check_bytes(len(file_bytes))
+    if mime_type == PDF_MIME:
+        return iter_pdf(file_bytes, budget, report=report, **pdf_options)
+    if mime_type == DOCX_MIME:
+        return iter_docx(file_bytes, budget)
+    return iter_image(file_bytes, mime_type, budget, **(image_options or {}))
+
+
+def extract_source(file_bytes, mime_type, budget=None, image_options=None, report=None,
+                   **pdf_options):
+    """Parties de prompt décrivant le texte support, prêtes pour `generate_content`.
+
+    Les passages texte consécutifs sont regroupés et normalisés ; lève
+    `BudgetExceeded` dès qu'un plafond est franchi, sans finir la lecture du
+    document. Si `report` est un dict, il reçoit les tokens texte avant et
+    après normalisation, et pour un PDF les mesures de `iter_pdf`.
+    """
+    parts = []
+    chunks = []
+    for part in iter_source(file_bytes, mime_type, budget, image_options, report, **pdf_options):
+        if isinstance(part, str):
+            chunks.append(part)
+            continue
+        if chunks:
+            parts.append(chunks)
+            chunks = []
+        parts.append(part)
+    if chunks:
+        parts.append(chunks)
+
+    groups = [part for part in parts if isinstance(part, list)]
+    tokens_before = sum(estimate_text_tokens(chunk) for group in groups for chunk in group)
+    if mime_type == PDF_MIME:
+        # Le gabarit (titre courant, pied de page) se repère sur toutes les pages texte
+        boilerplate = find_boilerplate([page for group in groups for page in group])
+        parts = [normalize_pages(part, boilerplate) if isinstance(part, list) else part for part in parts]
+    else:
+        parts = ["\n".join(normalize_text(p, wrapped=False) for p in part) if isinstance(part, list) else part
+                 for part in parts]
+    if report is not None:
+        tokens_after = sum(estimate_text_tokens(part) for part in parts if isinstance(part, str))
+        report.update(text_tokens=tokens_after, tokens_saved=tokens_before - tokens_after)
+
+    # L'introduction précède le premier passage texte
+    for i, part in enumerate(parts):
+        if isinstance(part, str):
+            parts[i] = SOURCE_INTRO + part
+            break
+    return parts
@@ -0,0 +1,59 @@
+"""Prétraitement des photos et scans déposés avant envoi au modèle."""
+import io
+
+from PIL import Image, ImageChops, ImageOps
+
+# Seuil d'écart au fond (0–255) au-delà duquel un pixel est du contenu
+MARGIN_THRESHOLD = 40
+# Marge conservée autour du contenu détecté, en pixels
+MARGIN_PADDING = 12
+
+PIL_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp"), "png": ("PNG", "image/png")}
+
+
+def crop_margins(img):
+    # Le fond est estimé à partir des quatre coins de l'image
+    gray = img if img.mode == "L" else img.convert("L")
+    w, h = gray.size
+    corners = sorted(gray.getpixel(xy) for xy in ((0, 0), (w - 1, 0), (0, h - 1), (w - 1, h - 1)))
+    background = (corners[1] + corners[2]) // 2
+    diff = ImageChops.difference(gray, Image.new("L", gray.size, background))
+    bbox = diff.point(lambda p: 255 if p > MARGIN_THRESHOLD else 0).getbbox()
+    if not bbox:
+        return img
+    left, top, right, bottom = bbox
+    bbox = (max(0, left - MARGIN_PADDING), max(0, top - MARGIN_PADDING),
+            min(w, right + MARGIN_PADDING), min(h, bottom + MARGIN_PADDING))
+    return img.crop(bbox) if bbox != (0, 0, w, h) else img
+
+
+def flatten_transparency(img):
+    # Fond transparent posé sur du blanc : converti tel quel, il deviendrait noir
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode in ("P", "L", "RGB") and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        return Image.alpha_composite(background, img).convert("RGB")
+    return img
+
+
+def preprocess_image(file_bytes, max_edge=1600, grayscale=True, image_format="jpeg", quality=70):
+    """Redresse (EXIF), recadre, réduit et réencode une photo de texte.
+
+    Renvoie (octets, type MIME, largeur, hauteur).
+    """
+    img = Image.open(io.BytesIO(file_bytes))
+    # Décodage JPEG directement à résolution réduite quand c'est possible
+    img.draft("L" if grayscale else "RGB", (max_edge, max_edge))
+    img = ImageOps.exif_transpose(img)
+    img = flatten_transparency(img)
+    img = img.convert("L" if grayscale else "RGB")
+    img = crop_margins(img)
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    pil_format, mime_type = PIL_FORMATS.get(image_format, PIL_FORMATS["jpeg"])
+    buffer = io.BytesIO()
+    if pil_format == "PNG":
+        img.save(buffer, pil_format, optimize=True)
+    else:
+        img.save(buffer, pil_format, quality=quality, optimize=True)
+    return buffer.getvalue(), mime_type, img.width, img.height
@@ -0,0 +1,318 @@
+"""Générations en tâche de fond, persistées dans SQLite.
+
+L'interface dépose une tâche puis interroge son état : la génération se
+poursuit même si l'onglet est rechargé ou la connexion coupée, et la fiche
+terminée reste récupérable par l'identifiant de la tâche.
+
+Un groupe réunit les tâches de plusieurs niveaux pour le même fichier : la
+première (meneuse) porte l'entrée et exécute tout le groupe, chaque tâche
+gardant son flux partiel et sa fiche.
+"""
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from adc.extraction import BudgetExceeded, IngestionBudget
+from adc.metrics import Trace
+from adc.pipeline import cached_fiches, consume_lines, prepare_source, regenerate_section
+from adc.scheduler import QueueFull, is_transient
+from adc.sections import replace_section
+
+ACTIVE = ("queued", "running")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,
+    cycle       TEXT NOT NULL,
+    mime_type   TEXT NOT NULL,
+    fingerprint TEXT,
+    input       BLOB,
+    position    INTEGER,
+    partial     TEXT,
+    report      TEXT,
+    text        TEXT,
+    docx        BLOB,
+    error       TEXT,
+    error_kind  TEXT,
+    created     REAL NOT NULL,
+    updated     REAL NOT NULL,
+    section     TEXT,
+    base        TEXT,
+    group_id    TEXT
+)
+"""
+# Colonnes ajoutées depuis la première version du schéma : (nom, type)
+ADDED_COLUMNS = (("section", "TEXT"), ("base", "TEXT"), ("group_id", "TEXT"))
+
+
+def error_kind(error):
+    """Catégorie d'erreur, pour le message affiché et les métriques."""
+    if isinstance(error, BudgetExceeded):
+        return "budget"
+    if isinstance(error, QueueFull):
+        return "queue_full"
+    if is_transient(error):
+        return "transient"
+    return "error"
+
+
+# Colonnes renvoyées par `get` : l'entrée et le .docx ne sont lus qu'à la demande
+SUMMARY = ("id, status, cycle, fingerprint, section, position, partial, report, text, error, error_kind,"
+           " created, updated")
+
+
+class JobStore:
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, kind in ADDED_COLUMNS:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Une connexion par opération : les workers et le script n'en partagent aucune
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, cycle_short, mime_type, fingerprint, file_bytes, section=None, base_text=None):
+        """`section` et `base_text` : régénérer une seule section de la fiche `base_text`."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, cycle, mime_type, fingerprint, input, section, base, created, updated)"
+                " VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, cycle_short, mime_type, fingerprint, file_bytes, section, base_text, now, now),
+            )
+        return job_id
+
+    def create_group(self, cycles, mime_type, fingerprints, file_bytes):
+        """Une tâche par niveau ; renvoie l'identifiant de la meneuse, seule à porter l'entrée."""
+        job_ids = [uuid.uuid4().hex for _ in cycles]
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO jobs (id, status, cycle, mime_type, fingerprint, input, group_id, created, updated)"
+                " VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?)",
+                [(job_id, cycle_short, mime_type, fingerprint, file_bytes if i == 0 else None, job_ids[0], now, now)
+                 for i, (job_id, cycle_short, fingerprint) in enumerate(zip(job_ids, cycles, fingerprints))],
+            )
+        return job_ids[0]
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {SUMMARY} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row is not None else None
+
+    def get_group(self, job_id):
+        """Tâches du groupe mené par `job_id`, par niveau ; [tâche] hors groupe."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {SUMMARY} FROM jobs WHERE id = ? OR group_id = ? ORDER BY cycle", (job_id, job_id)
+            ).fetchall()
+        return [_job(row) for row in rows]
+
+    def get_docx(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT docx FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["docx"] if row else None
+
+    def get_input(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT input, mime_type, cycle, fingerprint, section, base, created FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        return dict(row)
+
+    def update(self, job_id, **fields):
+        if "report" in fields:
+            fields["report"] = json.dumps(fields["report"], ensure_ascii=False)
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def set_positions(self, positions):
+        """{identifiant de tâche: place dans la file} ; vaut pour tout le groupe mené par la tâche."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("UPDATE jobs SET position = ?, updated = ? WHERE id = ? OR group_id = ?",
+                             [(position, now, job_id, job_id) for job_id, position in positions.items()])
+
+    def pending_ids(self):
+        with self._connect() as conn:
+            # Une tâche de groupe est reprise par sa meneuse
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND (group_id IS NULL OR group_id = id)"
+                " ORDER BY created", ACTIVE
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def purge(self, max_age):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated < ?",
+                (*ACTIVE, time.time() - max_age),
+            )
+
+
+def _job(row):
+    job = dict(row)
+    job["report"] = json.loads(job["report"]) if job["report"] else {}
+    return job
+
+
+class FicheJobHandler:
+    """Exécute une tâche ou un groupe : extraction, génération (en flux), compilation du .docx.
+
+    Renvoie {identifiant de tâche: (texte, octets du .docx)}.
+
+    `make_model(on_position, trace)` fournit le modèle ordonnancé de la tâche ;
+    si `metrics` (adc.metrics.MetricsRecorder) est fourni, chaque tâche y
+    écrit sa trace, réussie ou non ; si `contexts` (adc.context.ContextCache)
+    l'est, le texte support d'un document déjà vu n'est pas renvoyé.
+    """
+
+    def __init__(self, make_model, cache, model_name, ingestion_limits, image_options, pdf_options,
+                 streaming=True, metrics=None, contexts=None):
+        self.make_model = make_model
+        self.cache = cache
+        self.model_name = model_name
+        self.ingestion_limits = ingestion_limits
+        self.image_options = image_options
+        self.pdf_options = pdf_options
+        self.streaming = streaming
+        self.metrics = metrics
+        self.contexts = contexts
+
+    def __call__(self, store, job_id):
+        trace = Trace(model=self.model_name)
+        try:
+            return self._generate(store, job_id, trace)
+        except Exception as e:
+            trace.status = error_kind(e)
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record(trace)
+
+    def _generate(self, store, job_id, trace):
+        with trace.stage("read"):
+            job = store.get_input(job_id)
+        # Attente d'un worker libre depuis le dépôt de la tâche
+        trace.add_time("queue", max(0.0, trace.started - job["created"]))
+        # Tâches exécutées ici, par niveau : tout le groupe, ou la seule tâche
+        members = {member["cycle"]: member["id"] for member in store.get_group(job_id)}
+        trace.labels.update(cycle="+".join(members), mime_type=job["mime_type"],
+                            kind="section" if job["section"] else "fiche")
+        trace.set("input_bytes", len(job["input"]))
+        with trace.stage("extract"):
+            source = prepare_source(job.pop("input"), job["mime_type"],
+                                    budget=IngestionBudget(**self.ingestion_limits),
+                                    image_options=self.image_options, contexts=self.contexts,
+                                    **self.pdf_options)
+        trace.add_source(source)
+        for member_id in members.values():
+            store.update(member_id, report={"tokens_saved": source.report.get("tokens_saved", 0),
+                                            "long_text": source.long_text is not None})
+
+        def on_position(position):
+            for member_id in members.values():
+                store.update(member_id, position=position)
+
+        def consume_into(member_id):
+            def on_lines(text):
+                if job["section"]:
+                    # Fiche de départ où la section s'écrit au fil de l'eau
+                    text = replace_section(job["base"], job["section"], text)
+                store.update(member_id, partial=text, position=None)
+            return lambda response: consume_lines(response, on_lines)
+
+        if job["section"]:
+            consume = consume_into(job_id) if self.streaming else None
+            return {job_id: regenerate_section(self.make_model(on_position, trace), source, job["cycle"],
+                                               job["base"], job["section"], self.cache, self.model_name,
+                                               consume, trace)}
+        consumes = {cycle_short: consume_into(member_id) for cycle_short, member_id in members.items()}
+        results = cached_fiches(lambda: self.make_model(on_position, trace), source, list(members), self.cache,
+                                self.model_name, consumes if self.streaming else None, trace)
+        return {members[cycle_short]: (text, docx_bytes) for cycle_short, (text, docx_bytes, _) in results.items()}
+
+
+class JobRunner:
+    """Pool de workers ; au démarrage, reprend les tâches laissées en cours.
+
+    Une tâche attend un worker libre à une place connue (colonne `position`),
+    comme un appel dans la file de l'ordonnanceur. Au-delà de `max_pending`
+    tâches en attente (0 : illimité), un dépôt est refusé par QueueFull.
+    """
+
+    def __init__(self, store, handler, workers=4, retention=7 * 24 * 3600, max_pending=0):
+        self.store = store
+        self.handler = handler
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="adc-job")
+        self._waiting = []  # tâches déposées qu'aucun worker n'a encore prises, dans l'ordre
+        self._lock = threading.Lock()
+        store.purge(retention)
+        for job_id in store.pending_ids():
+            store.update(job_id, status="queued")
+            self._enqueue(lambda job_id=job_id: job_id, limit=False)
+
+    def submit(self, cycle_short, mime_type, fingerprint, file_bytes, section=None, base_text=None):
+        return self._enqueue(
+            lambda: self.store.create(cycle_short, mime_type, fingerprint, file_bytes, section, base_text)
+        )
+
+    def submit_group(self, cycles, mime_type, fingerprints, file_bytes):
+        """Une fiche par niveau pour le même fichier : une extraction, des générations en parallèle."""
+        return self._enqueue(lambda: self.store.create_group(cycles, mime_type, fingerprints, file_bytes))
+
+    def _enqueue(self, create, limit=True):
+        with self._lock:
+            if limit and self.max_pending and len(self._waiting) >= self.max_pending:
+                raise QueueFull("le service est très sollicité. Réessayez dans une minute.")
+            job_id = create()
+            self._waiting.append(job_id)
+            self.store.set_positions({job_id: len(self._waiting)})
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def _start(self, job_id):
+        # Un worker prend la tâche : les suivantes avancent d'une place
+        with self._lock:
+            self._waiting.remove(job_id)
+            positions = {waiting_id: position for position, waiting_id in enumerate(self._waiting, start=1)}
+            self.store.set_positions({job_id: None, **positions})
+
+    def _run(self, job_id):
+        self._start(job_id)
+        member_ids = [job["id"] for job in self.store.get_group(job_id)]
+        for member_id in member_ids:
+            self.store.update(member_id, status="running")
+        try:
+            results = self.handler(self.store, job_id)
+        except Exception as e:
+            for member_id in member_ids:
+                self.store.update(member_id, status="error", error=str(e), error_kind=error_kind(e), input=None,
+                                  base=None)
+        else:
+            # L'entrée n'est plus utile une fois la fiche prête
+            for member_id, (text, docx_bytes) in results.items():
+                self.store.update(member_id, status="done", text=text, docx=docx_bytes, partial=None,
+                                  position=None, input=None, base=None)
@@ -0,0 +1,88 @@
+"""Mode texte long : analyse des extraits en parallèle puis synthèse de la fiche."""
+from concurrent.futures import ThreadPoolExecutor
+
+from adc.cache import fiche_key
+from adc.extraction import CHARS_PER_TOKEN, estimate_text_tokens
+from adc.prompt import PROMPT_VERSION, chunk_analysis_prompt, synthesis_prompt
+
+# Au-delà de ce nombre de tokens de texte, la fiche passe par le mode texte long
+LONG_DOC_TOKENS = 30_000
+CHUNK_TOKENS = 8_000
+OVERLAP_TOKENS = 400
+
+
+def is_long_text(text, threshold=LONG_DOC_TOKENS):
+    return estimate_text_tokens(text) > threshold
+
+
+def split_chunks(text, chunk_tokens=CHUNK_TOKENS, overlap_tokens=OVERLAP_TOKENS):
+    """Découpe aux limites de paragraphe, avec un recouvrement entre extraits.
+
+    Le recouvrement garde une chaîne anaphorique ou une phrase à cheval
+    entière dans au moins un extrait.
+    """
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    paragraphs = [p for p in text.split("\n") if p.strip()]
+
+    chunks = []
+    current = []
+    size = 0
+    for paragraph in paragraphs:
+        for piece in _split_long(paragraph, max_chars):
+            if current and size + len(piece) > max_chars:
+                chunks.append(current)
+                current, size = _overlap(current, overlap_chars)
+                if size + len(piece) > max_chars:
+                    current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        chunks.append(current)
+    return ["\n".join(chunk) for chunk in chunks]
+
+
+def _split_long(paragraph, max_chars):
+    # Un paragraphe plus long qu'un extrait est coupé aux espaces
+    while len(paragraph) > max_chars:
+        cut = paragraph.rfind(" ", 0, max_chars)
+        cut = cut if cut > 0 else max_chars
+        yield paragraph[:cut]
+        paragraph = paragraph[cut:].lstrip()
+    yield paragraph
+
+
+def _overlap(paragraphs, overlap_chars):
+    # Derniers paragraphes de l'extrait précédent, dans la limite du recouvrement
+    tail = []
+    size = 0
+    for paragraph in reversed(paragraphs):
+        if size + len(paragraph) > overlap_chars:
+            break
+        tail.insert(0, paragraph)
+        size += len(paragraph) + 1
+    return tail, size
+
+
+def analyse_chunks(model, chunks, cycle_short, cache=None, model_name="", workers=4):
+    """Analyse chaque extrait en parallèle ; chaque analyse est mise en cache à part."""
+    def analyse(index, chunk):
+        prompt = [chunk_analysis_prompt(cycle_short, index, len(chunks)), chunk]
+
+        def compute():
+            return model.generate_content(prompt).text, None
+
+        if cache is None:
+            return compute()[0]
+        key = fiche_key([chunk], cycle_short, PROMPT_VERSION + "-analyse", model_name)
+        return cache.get_or_compute(key, compute)[0]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(analyse, i, chunk) for i, chunk in enumerate(chunks, start=1)]
+        return [future.result() for future in futures]
+
+
+def long_text_prompt(model, text, cycle_short, cache=None, model_name="", workers=4):
+    """Prompt de synthèse construit à partir des analyses d'extraits."""
+    analyses = analyse_chunks(model, split_chunks(text), cycle_short, cache, model_name, workers)
+    return [synthesis_prompt(cycle_short, analyses)]
@@ -0,0 +1,284 @@
+"""Mesures par génération : durée de chaque étape, tokens, volume envoyé.
+
+Chaque génération produit une trace écrite en ligne JSON (traces.jsonl) ;
+les traces sont agrégées en métriques au format texte Prometheus
+(histogrammes et compteurs), réécrites dans metrics.prom après chaque
+génération et servies en HTTP si un port est configuré.
+"""
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from adc.scheduler import estimate_prompt_tokens
+
+# Étapes mesurées, dans l'ordre du pipeline ; "queue" : attente d'un worker puis de l'ordonnanceur
+STAGES = ("queue", "read", "extract", "rasterize", "context", "model", "docx")
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+BYTES_BUCKETS = (10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000, 20_000_000)
+
+
+class Trace:
+    """Trace d'une génération ; les durées d'une même étape s'additionnent.
+
+    Partagée entre les threads d'une génération (analyse des extraits en
+    parallèle) : les mises à jour sont protégées par un verrou.
+    """
+
+    def __init__(self, **labels):
+        self.id = uuid.uuid4().hex
+        self.labels = labels
+        self.started = time.time()
+        self.status = "done"
+        self.stages = {}
+        self.values = {}
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + amount
+
+    def set(self, name, value):
+        with self._lock:
+            self.values[name] = value
+
+    def add_source(self, source):
+        """Reporte les mesures de l'extraction (PreparedSource.report)."""
+        report = source.report
+        if report.get("rasterize_seconds"):
+            self.add_time("rasterize", report["rasterize_seconds"])
+        for name in ("pages", "scanned_pages", "text_tokens", "tokens_saved"):
+            if name in report:
+                self.set(name, report[name])
+        self.set("payload_bytes", sum(
+            len(part.encode("utf-8")) if isinstance(part, str) else len(part["data"])
+            for part in source.parts
+        ))
+        self.set("long_text", source.long_text is not None)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "time": self.started,
+            "status": self.status,
+            "labels": self.labels,
+            "total": round(time.perf_counter() - self._t0, 4),
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "values": dict(self.values),
+        }
+
+
+class _TracedStream:
+    """Réponse en flux : temps jusqu'au premier morceau, durée totale, tokens."""
+
+    def __init__(self, response, trace, started):
+        self.response = response
+        self.trace = trace
+        self.started = started
+
+    def __iter__(self):
+        first = True
+        try:
+            for chunk in self.response:
+                if first:
+                    self.trace.add_time("first_token", time.perf_counter() - self.started)
+                    first = False
+                yield chunk
+        finally:
+            self.trace.add_time("model", time.perf_counter() - self.started)
+            _record_usage(self.trace, self.response)
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+def _record_usage(trace, response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    trace.count("input_tokens", getattr(usage, "prompt_token_count", 0) or 0)
+    trace.count("output_tokens", getattr(usage, "candidates_token_count", 0) or 0)
+    trace.count("cached_tokens", getattr(usage, "cached_content_token_count", 0) or 0)
+
+
+class TracedModel:
+    """Enveloppe un modèle pour mesurer chaque `generate_content` dans la trace.
+
+    À placer sous l'ordonnanceur : l'attente dans la file n'est pas comptée.
+    """
+
+    def __init__(self, model, trace):
+        self.model = model
+        self.trace = trace
+
+    def generate_content(self, prompt_parts, stream=False, **kwargs):
+        self.trace.count("model_calls")
+        self.trace.count("estimated_input_tokens", estimate_prompt_tokens(prompt_parts))
+        started = time.perf_counter()
+        response = self.model.generate_content(prompt_parts, stream=stream, **kwargs)
+        if stream:
+            return _TracedStream(response, self.trace, started)
+        elapsed = time.perf_counter() - started
+        self.trace.add_time("first_token", elapsed)
+        self.trace.add_time("model", elapsed)
+        _record_usage(self.trace, response)
+        return response
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in sorted(labels.items())) + "}"
+
+
+class MetricsRecorder:
+    """Écrit les traces et tient les métriques agrégées du processus.
+
+    `traces.jsonl` est renommé en `traces.jsonl.1` au-delà de `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes=10 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.traces_path = os.path.join(directory, "traces.jsonl")
+        self.metrics_path = os.path.join(directory, "metrics.prom")
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _observe(self, name, labels, value, buckets=SECONDS_BUCKETS):
+        key = (name, _labels(**labels))
+        if key not in self._histograms:
+            self._histograms[key] = Histogram(buckets)
+        self._histograms[key].observe(value)
+
+    def _increment(self, name, labels, amount=1):
+        key = (name, _labels(**labels))
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def record(self, trace):
+        entry = trace.to_dict()
+        with self._lock:
+            self._append(entry)
+            self._aggregate(entry)
+            self._write_metrics()
+        return entry
+
+    def _append(self, entry):
+        try:
+            if os.path.getsize(self.traces_path) > self.max_bytes:
+                os.replace(self.traces_path, self.traces_path + ".1")
+        except OSError:
+            pass
+        with open(self.traces_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _aggregate(self, entry):
+        labels = entry["labels"]
+        values = entry["values"]
+        source = {"mime_type": labels.get("mime_type", ""),
+                  "scanned": "yes" if values.get("scanned_pages") else "no"}
+        self._increment("adc_generations_total", {**labels, "status": entry["status"],
+                                                  "cache": "hit" if values.get("cache_hit") else "miss"})
+        self._observe("adc_generation_seconds", {**source, "status": entry["status"]}, entry["total"])
+        for stage, seconds in entry["stages"].items():
+            self._observe("adc_stage_seconds", {**source, "stage": stage}, seconds)
+        if "payload_bytes" in values:
+            self._observe("adc_payload_bytes", source, values["payload_bytes"], BYTES_BUCKETS)
+        for name in ("model_calls", "input_tokens", "output_tokens", "cached_tokens", "estimated_input_tokens",
+                     "hedges", "hedge_wins", "structure_problems", "repairs"):
+            if values.get(name):
+                self._increment(f"adc_{name}_total", {}, values[name])
+
+    def render(self):
+        """Métriques au format d'exposition texte de Prometheus."""
+        lines = []
+        for name in sorted({name for name, _ in self._counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(self._counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{labels} {value}")
+        for name in sorted({name for name, _ in self._histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), hist in sorted(self._histograms.items()):
+                if metric != name:
+                    continue
+                inner = labels[1:-1]
+                sep = "," if inner else ""
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{{{inner}{sep}le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{inner}{sep}le="+Inf"}} {hist.count}')
+                lines.append(f"{name}_sum{labels} {hist.sum:.6g}")
+                lines.append(f"{name}_count{labels} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def _write_metrics(self):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, self.metrics_path)
+
+    def recent(self, limit=20):
+        """Dernières traces écrites, de la plus récente à la plus ancienne."""
+        try:
+            with open(self.traces_path, encoding="utf-8") as f:
+                lines = f.readlines()[-limit:]
+        except OSError:
+            return []
+        return [json.loads(line) for line in reversed(lines)]
+
+
+def serve_metrics(recorder, port, host="127.0.0.1"):
+    """Sert `/metrics` en HTTP dans un thread de fond ; renvoie le serveur."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            with recorder._lock:
+                body = recorder.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="adc-metrics").start()
+    return server
@@ -0,0 +1,220 @@
+"""Accès au modèle : Gemini en production, modèle factice local pour les essais.
+
+Un backend est une fabrique `(api_key, model_name, **options)` qui renvoie un
+objet exposant `generate_content(prompt_parts, stream=False, context=None)`.
+La réponse a un attribut `text`, un `usage_metadata` (ou None) et, en flux,
+s'itère en morceaux ayant `text` et `parts`.
+
+`cache_context(parts, ttl)` dépose un texte support chez le fournisseur et
+renvoie son nom ; passé en `context`, il précède alors les parties du prompt
+sans être renvoyé (voir adc.context).
+"""
+import datetime
+import io
+import math
+import random
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+# Au-delà (octets d'images), les pages passent par l'API Files plutôt qu'en ligne :
+# une requête Gemini est plafonnée à 20 Mo, base64 compris
+INLINE_LIMIT = 14 * 1024 * 1024
+
+
+class GeminiModel:
+    """Modèle Gemini, avec le cache de contexte du fournisseur."""
+
+    def __init__(self, api_key, model_name=DEFAULT_MODEL):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self._contexts = {}  # nom → (modèle lié au contexte, expiration)
+
+    def generate_content(self, prompt_parts, stream=False, context=None, **kwargs):
+        model = self.model if context is None else self._contexts[context][0]
+        return model.generate_content(prompt_parts, stream=stream, **kwargs)
+
+    def cache_context(self, parts, ttl):
+        from google.generativeai import caching
+        if sum(len(p["data"]) for p in parts if not isinstance(p, str)) > INLINE_LIMIT:
+            # Livret scanné volumineux : pages déposées une à une, référencées dans le cache
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                parts = list(pool.map(self._upload, parts))
+        cached = caching.CachedContent.create(
+            model=self.model_name, contents=[{"role": "user", "parts": parts}],
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+        now = time.time()
+        self._contexts = {name: entry for name, entry in self._contexts.items() if entry[1] > now}
+        self._contexts[cached.name] = (self.genai.GenerativeModel.from_cached_content(cached), now + ttl)
+        return cached.name
+
+    def _upload(self, part):
+        if isinstance(part, str):
+            return part
+        return self.genai.upload_file(io.BytesIO(part["data"]), mime_type=part["mime_type"])
+
+
+def gemini_model(api_key, model_name=DEFAULT_MODEL):
+    return GeminiModel(api_key, model_name)
+
+
+def stub_model(api_key=None, model_name=DEFAULT_MODEL, **options):
+    return MockModel(**options)
+
+
+BACKENDS = {"gemini": gemini_model, "stub": stub_model}
+
+
+def make_model(backend, api_key=None, model_name=DEFAULT_MODEL, **options):
+    """Modèle du backend demandé ; `options` ne sert qu'au modèle factice."""
+    if backend not in BACKENDS:
+        raise ValueError(f"backend inconnu : {backend} (choix : {', '.join(BACKENDS)})")
+    if backend == "gemini":
+        return gemini_model(api_key, model_name)
+    return BACKENDS[backend](api_key, model_name, **options)
+
+
+MOCK_FICHE = """## 1. TITRE & INFORMATIONS
+**Niveau :** {cycle} — **Durée estimée :** 45 min — **Organisation :** individuel puis groupes de 4
+
+## 2. OBJECTIFS DE COMPRÉHENSION
+- Lexique : repérer les mots opaques du texte et les expliciter par le contexte
+- Anaphores : suivre la chaîne de reprises du personnage principal
+- Implicite : inférer les intentions des personnages à partir de leurs actes
+
+## 3. DÉROULÉ EN 4 PHASES
+### Phase 1 : Lecture individuelle silencieuse
+Chaque élève lit le texte et note ce qui lui pose problème.
+### Phase 2 : Tableau collaboratif
+| Ce qu'on sait | Ce qu'on ne sait pas | On n'est pas d'accord |
+|---|---|---|
+| Le personnage part de chez lui | Pourquoi il part | S'il a raison de partir |
+| Il rencontre quelqu'un | Qui est cette personne | Si elle est bienveillante |
+| L'histoire se finit bien | Ce qu'il a appris | Si la fin est juste |
+### Phase 3 : Mise en commun et résolution collective
+Confrontation des tableaux et retour au texte pour trancher.
+### Phase 4 : Retour sur les stratégies de compréhension mobilisées
+Qu'avons-nous fait pour comprendre ce qui n'était pas écrit ?
+
+## 4. QUESTIONS-CLÉS
+1. Qui sont les personnages de l'histoire ?
+2. Où et quand se passe l'histoire ?
+3. Que veut le personnage principal ?
+4. Pourquoi agit-il ainsi ?
+5. Que pense l'auteur de ce qui arrive ?
+
+## 5. POINTS DE VIGILANCE
+- Confusion possible entre les personnages désignés par « il »
+- L'implicite de la fin peut échapper aux lecteurs fragiles
+"""
+
+MOCK_ANALYSIS = """- LEXIQUE : « chaumière », « besace »
+- ANAPHORES : « il » → le personnage principal
+- IMPLICITE : la peur du personnage n'est pas dite
+- QUESTIONS : Pourquoi part-il ? Que craint-il ?
+"""
+
+
+class MockChunk:
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text]
+
+
+class MockUsage:
+    def __init__(self, prompt_token_count, candidates_token_count, cached_content_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = cached_content_token_count
+
+
+class MockResponse:
+    def __init__(self, text, chunks=None, usage_metadata=None, chunk_delay=0.0):
+        self.text = text
+        self._chunks = chunks
+        self.usage_metadata = usage_metadata
+        self.chunk_delay = chunk_delay
+
+    def __iter__(self):
+        for i, chunk in enumerate(self._chunks or [MockChunk(self.text)]):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield chunk
+
+
+class MockModel:
+    """Modèle factice déterministe : renvoie une fiche au format ADC sans appel réseau.
+
+    `latency` : délai simulé (secondes) avant le premier morceau, ou avant la
+    réponse complète hors flux ; `chunk_size` et `chunk_delay` : taille des
+    morceaux renvoyés en mode flux et délai entre deux morceaux ;
+    `responses` : textes de remplacement, clés "fiche" et "analysis" ;
+    `bandwidth` : débit d'envoi simulé (octets/s, 0 : instantané), payé sur
+    le prompt et sur le texte support mis en cache, mais pas à chaque
+    référence au cache ; `latency_sigma` : dispersion log-normale de
+    `latency`, qui en devient la médiane (0 : latence fixe) ; `slow_rate` :
+    part des appels dont la latence est multipliée par `slow_factor` (queue
+    de latence). Hors flux, la réponse arrive après la latence plus la durée
+    du flux.
+    """
+
+    def __init__(self, latency=0.0, chunk_size=120, chunk_delay=0.0, responses=None, bandwidth=0,
+                 slow_rate=0.0, slow_factor=5.0, latency_sigma=0.0):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.responses = {"fiche": MOCK_FICHE, "analysis": MOCK_ANALYSIS, **(responses or {})}
+        self.bandwidth = bandwidth
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.calls = 0
+        self.contexts = {}  # nom → (parties, expiration)
+
+    def _send(self, parts):
+        if self.bandwidth:
+            size = sum(len(p.encode("utf-8")) if isinstance(p, str) else len(p["data"]) for p in parts)
+            time.sleep(size / self.bandwidth)
+
+    def cache_context(self, parts, ttl):
+        self._send(parts)
+        name = f"cachedContents/mock-{uuid.uuid4().hex[:12]}"
+        self.contexts[name] = (list(parts), time.time() + ttl)
+        return name
+
+    def generate_content(self, prompt_parts, stream=False, context=None, **kwargs):
+        self.calls += 1
+        self._send(prompt_parts)
+        cached = []
+        if context is not None:
+            cached, expires = self.contexts.get(context, (None, 0))
+            if cached is None or expires < time.time():
+                raise LookupError(f"contexte inconnu ou expiré : {context}")
+        prompt = prompt_parts[0] if prompt_parts and isinstance(prompt_parts[0], str) else ""
+        match = re.search(r"Cycle \d", prompt)
+        if "Voici l'extrait" in prompt:
+            text = self.responses["analysis"]
+        else:
+            text = self.responses["fiche"].replace("{cycle}", match.group(0) if match else "Cycle 2")
+        # Tokens estimés comme Gemini : ~4 caractères par token, 258 par image ;
+        # le texte support en cache compte dans le prompt, et à part
+        cached_tokens = _mock_tokens(cached)
+        usage = MockUsage(_mock_tokens(prompt_parts) + cached_tokens, math.ceil(len(text) / 4), cached_tokens)
+        chunks = [MockChunk(text[i:i + self.chunk_size]) for i in range(0, len(text), self.chunk_size)]
+        latency = self.latency * random.lognormvariate(0, self.latency_sigma) if self.latency_sigma else self.latency
+        slow = self.slow_rate and random.random() < self.slow_rate
+        time.sleep(latency * (self.slow_factor if slow else 1))
+        if not stream:
+            time.sleep(self.chunk_delay * max(0, len(chunks) - 1))
+            return MockResponse(text, usage_metadata=usage)
+        return MockResponse(text, chunks, usage, self.chunk_delay)
+
+
+def _mock_tokens(parts):
+    return sum(math.ceil(len(p) / 4) if isinstance(p, str) else 258 for p in parts)
@@ -0,0 +1,101 @@
+"""Nettoyage du texte extrait avant envoi au modèle : moins de tokens, même contenu."""
+import re
+from collections import Counter
+
+# Lignes de tête et de pied de page examinées sur chaque page
+EDGE_LINES = 2
+# Un titre courant ou un pied de page tient sur une ligne courte
+MAX_BOILERPLATE_CHARS = 80
+# Une ligne de bord présente sur au moins cette part des pages est du gabarit
+BOILERPLATE_RATIO = 0.5
+
+PAGE_NUMBER = re.compile(r"^[\s\-–—]*(?:page\s*|p\.\s*)?\d{1,4}(?:\s*(?:/|sur)\s*\d{1,4})?[\s\-–—]*$", re.IGNORECASE)
+DIGITS = re.compile(r"\d+")
+HYPHENATED = re.compile(r"(\w+)-\n([a-zà-ÿ]\w*)")
+WORDS = re.compile(r"\w+(?:-\w+)*")
+SOFT_HYPHEN = re.compile("­")
+SPACES = re.compile(r"[ \t ]+")
+BLANK_LINES = re.compile(r"\n{3,}")
+SENTENCE_END = tuple(".!?:;»\"…)")
+
+
+def _edge_key(line):
+    # « Chapitre 2 — p. 14 » et « Chapitre 2 — p. 15 » sont le même gabarit
+    return DIGITS.sub("#", line.strip().lower())
+
+
+def find_boilerplate(pages):
+    """Lignes de tête / pied de page répétées sur une majorité de pages."""
+    if len(pages) < 3:
+        return set()
+    counts = Counter()
+    for page in pages:
+        lines = [line for line in page.splitlines() if line.strip()]
+        if len(lines) <= 2 * EDGE_LINES:
+            continue
+        edges = lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+        counts.update({_edge_key(line) for line in edges if len(line.strip()) <= MAX_BOILERPLATE_CHARS})
+    threshold = max(2, BOILERPLATE_RATIO * len(pages))
+    return {key for key, n in counts.items() if n >= threshold}
+
+
+def strip_page_furniture(page, boilerplate=frozenset()):
+    # Numéros de page (en tête ou en pied de page seulement : « 1914 » seul
+    # sur sa ligne au milieu du texte est une date) et gabarit répété (titre
+    # courant, nom de l'éditeur…)
+    filled = [i for i, line in enumerate(page.splitlines()) if line.strip()]
+    edges = set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+    lines = []
+    for i, line in enumerate(page.splitlines()):
+        stripped = line.strip()
+        if (i in edges and PAGE_NUMBER.match(stripped)) or (stripped and _edge_key(stripped) in boilerplate):
+            continue
+        lines.append(stripped)
+    return "\n".join(lines)
+
+
+def normalize_text(text, wrapped=True):
+    """Espaces, césures et lignes coupées.
+
+    `wrapped` : texte mis en page (PDF), dont les retours à la ligne viennent
+    de la largeur de la page. Dans un .docx, un retour à la ligne est voulu
+    (vers d'un poème, liste) : on ne recolle alors rien.
+    """
+    text = "\n".join(SPACES.sub(" ", line).strip() for line in text.splitlines())
+    text = SOFT_HYPHEN.sub("", text)
+    if not wrapped:
+        return BLANK_LINES.sub("\n\n", text).strip()
+
+    # Césures de fin de ligne : « compré-\nhension » → « compréhension », sauf
+    # mot composé écrit ailleurs avec son trait d'union (« grand-\nmère » → « grand-mère »)
+    vocabulary = set(WORDS.findall(text.lower()))
+
+    def rejoin(match):
+        head, tail = match.groups()
+        if f"{head}-{tail}".lower() in vocabulary:
+            return f"{head}-{tail}"
+        return head + tail
+
+    text = HYPHENATED.sub(rejoin, text)
+
+    # Lignes coupées en milieu de phrase : on recolle si la suivante
+    # commence en minuscule (dans un PDF, les vers et répliques commencent
+    # le plus souvent en majuscule ou par un tiret)
+    joined = []
+    for line in text.split("\n"):
+        if joined and joined[-1] and line[:1].islower() and not joined[-1].endswith(SENTENCE_END):
+            joined[-1] += " " + line
+        else:
+            joined.append(line)
+    return BLANK_LINES.sub("\n\n", "\n".join(joined)).strip()
+
+
+def normalize_pages(pages, boilerplate=None):
+    """Texte continu d'une suite de pages PDF, débarrassé du gabarit.
+
+    Les pages sont recollées avant normalisation pour qu'une phrase ou une
+    césure à cheval sur deux pages soit réparée.
+    """
+    if boilerplate is None:
+        boilerplate = find_boilerplate(pages)
+    return normalize_text("\n".join(strip_page_furniture(page, boilerplate) for page in pages))
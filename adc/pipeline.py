@@ -0,0 +1,234 @@
+"""Chaîne de génération d'une fiche, commune à l'interface et au mode lot."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from adc.cache import fiche_key
+from adc.extraction import SOURCE_INTRO, extract_source
+from adc.longdoc import analyse_chunks, is_long_text, long_text_prompt, split_chunks
+from adc.prompt import PROMPT_VERSION, analysis_notes, fiche_prompt, repair_prompt, section_prompt
+from adc.rendering import RENDER_VERSION, create_adc_docx_final
+from adc.scheduler import StreamRestart
+from adc.sections import SECTION_TITLES, extract_section, has_intro, other_sections, replace_section, split_sections
+from adc.validation import section_problems, validate_fiche
+
+
+class PreparedSource:
+    """Texte support extrait une fois, réutilisable pour plusieurs niveaux.
+
+    `contexts` (adc.context.ContextCache) : si fourni, le texte support est
+    déposé une fois chez le fournisseur et les appels y font référence.
+    """
+
+    def __init__(self, parts, report=None, contexts=None):
+        self.parts = parts
+        self.report = report or {}
+        self.contexts = contexts
+        # Contenu haché pour le cache : texte ou octets d'image
+        self.sources = [p if isinstance(p, str) else p["data"] for p in parts]
+        # Texte long (sans pages scannées) : analyse par extraits puis synthèse
+        self.long_text = None
+        if all(isinstance(p, str) for p in self.sources):
+            text = "\n".join(self.sources).removeprefix(SOURCE_INTRO)
+            if is_long_text(text):
+                self.long_text = text
+
+
+def prepare_source(file_bytes, mime_type, budget=None, image_options=None, contexts=None, **pdf_options):
+    report = {}
+    parts = extract_source(file_bytes, mime_type, budget=budget, image_options=image_options,
+                           report=report, **pdf_options)
+    return PreparedSource(parts, report, contexts)
+
+
+def fiche_cache_key(source, cycle_short, model_name):
+    # Contenu extrait + niveau + version du prompt et du rendu + modèle
+    return fiche_key(source.sources, cycle_short, f"{PROMPT_VERSION}.{RENDER_VERSION}", model_name)
+
+
+def source_request(prompt, source, trace=None):
+    """(parties du prompt, options d'appel) : la consigne suivie du texte support,
+    ou la consigne seule et la référence au texte support déjà en cache."""
+    session = source.contexts.open(source, trace) if source.contexts is not None else None
+    if session is None:
+        return [prompt] + source.parts, {}
+    return [prompt], {"context": session.name}
+
+
+def fiche_request(model, source, cycle_short, cache=None, model_name="", trace=None):
+    if source.long_text is not None:
+        return long_text_prompt(model, source.long_text, cycle_short, cache, model_name), {}
+    return source_request(fiche_prompt(cycle_short), source, trace)
+
+
+def generate_fiche(model, source, cycle_short, cache=None, model_name="", consume_stream=None,
+                   trace=None):
+    """Appelle le modèle puis compile le .docx ; renvoie (texte, octets du .docx).
+
+    `consume_stream(response)` : si fourni, la réponse est demandée en flux et
+    cette fonction la lit jusqu'au bout en renvoyant le texte complet.
+    `trace` (adc.metrics.Trace) : reçoit la durée de compilation du .docx.
+    Une fiche mal structurée est réparée section par section (repair_fiche).
+    """
+    parts, options = fiche_request(model, source, cycle_short, cache, model_name, trace)
+    if consume_stream is not None:
+        text = consume_stream(model.generate_content(parts, stream=True, **options))
+    else:
+        text = model.generate_content(parts, **options).text
+    text = repair_fiche(model, source, cycle_short, text, cache, model_name, trace)
+    return text, compile_docx(text, cycle_short, trace)
+
+
+def repair_fiche(model, source, cycle_short, text, cache=None, model_name="", trace=None):
+    """Fiche dont les sections absentes ou mal structurées sont redemandées au modèle.
+
+    Un seul appel, court, pour toutes les sections fautives (adc.validation) ;
+    une section réécrite ne remplace l'ancienne que si elle a moins de
+    problèmes. Si l'appel échoue, la fiche est gardée telle quelle.
+
+    Rien n'est réparé quand une section manque et que la fiche commence par
+    du texte hors section : son titre n'a peut-être pas été reconnu, et
+    ajouter la section la dédoublerait.
+    """
+    problems = validate_fiche(text)
+    if not problems:
+        return text
+    if trace is not None:
+        trace.count("structure_problems", sum(len(found) for found in problems.values()))
+    if has_intro(text) and any(found == ["section absente"] for found in problems.values()):
+        return text
+    if trace is not None:
+        trace.count("repairs")
+    prompt = repair_prompt(cycle_short, {SECTION_TITLES[key]: found for key, found in problems.items()},
+                           other_sections(text, *problems))
+    try:
+        parts, options = grounded_request(model, source, cycle_short, prompt, cache, model_name, trace)
+        repaired = dict(split_sections(model.generate_content(parts, **options).text))
+    except Exception:
+        return text
+    for key, found in problems.items():
+        if key in repaired and len(section_problems(key, repaired[key])) < len(found):
+            text = replace_section(text, key, repaired[key])
+    return text
+
+
+def compile_docx(text, cycle_short, trace=None):
+    started = time.perf_counter()
+    docx_bytes = create_adc_docx_final(text, cycle_short).getvalue()
+    if trace is not None:
+        trace.add_time("docx", time.perf_counter() - started)
+    return docx_bytes
+
+
+def section_request(model, source, cycle_short, fiche_text, section_key, cache=None, model_name="",
+                    trace=None):
+    prompt = section_prompt(cycle_short, SECTION_TITLES[section_key], other_sections(fiche_text, section_key))
+    return grounded_request(model, source, cycle_short, prompt, cache, model_name, trace)
+
+
+def grounded_request(model, source, cycle_short, prompt, cache=None, model_name="", trace=None):
+    """(parties du prompt, options d'appel) : `prompt` suivi du texte support."""
+    if source.long_text is not None:
+        # Texte long : les notes par extrait, déjà en cache, tiennent lieu de texte support
+        analyses = analyse_chunks(model, split_chunks(source.long_text), cycle_short, cache, model_name)
+        return [prompt, analysis_notes(analyses)], {}
+    return source_request(prompt, source, trace)
+
+
+def regenerate_section(model, source, cycle_short, fiche_text, section_key, cache=None, model_name="",
+                       consume_stream=None, trace=None):
+    """Réécrit la seule section `section_key` ; renvoie (fiche complète, octets du .docx).
+
+    Le modèle reçoit le texte support et les autres sections, et ne rédige que
+    celle-ci. La section obtenue est mise en cache à part, sous une clé qui
+    couvre la fiche de départ : la régénérer encore donne une autre version.
+    """
+    def compute():
+        parts, options = section_request(model, source, cycle_short, fiche_text, section_key, cache,
+                                         model_name, trace)
+        if consume_stream is not None:
+            text = consume_stream(model.generate_content(parts, stream=True, **options))
+        else:
+            text = model.generate_content(parts, **options).text
+        return extract_section(text, section_key), None
+
+    if cache is None:
+        section_text = compute()[0]
+    else:
+        key = fiche_key(source.sources + [fiche_text], cycle_short,
+                        f"{PROMPT_VERSION}-section-{section_key}", model_name)
+        section_text, _, hit = cache.get_or_compute(key, compute)
+        if trace is not None:
+            trace.set("cache_hit", hit)
+    text = replace_section(fiche_text, section_key, section_text)
+    return text, compile_docx(text, cycle_short, trace)
+
+
+def consume_lines(response, on_lines):
+    """Lit une réponse en flux jusqu'au bout et renvoie le texte complet.
+
+    `on_lines(texte)` reçoit le texte reçu jusqu'à la dernière ligne complète,
+    pour ne jamais montrer un titre ou une ligne de tableau coupés.
+    """
+    text = ""
+    shown = 0
+    for chunk in response:
+        if isinstance(chunk, StreamRestart):
+            # Flux repris depuis le début après une erreur
+            text, shown = "", 0
+            continue
+        if not chunk.parts:
+            continue
+        text += chunk.text
+        cut = text.rfind("\n")
+        if cut > shown:
+            shown = cut
+            on_lines(text[:cut])
+    return text
+
+
+def cached_fiche(get_model, source, cycle_short, cache, model_name, consume_stream=None, trace=None):
+    """Fiche depuis le cache, sinon générée ; `get_model()` n'est appelé qu'en cas d'absence.
+
+    Renvoie (texte, octets du .docx, trouvée en cache).
+    """
+    key = fiche_cache_key(source, cycle_short, model_name)
+    text, docx_bytes, hit = cache.get_or_compute(
+        key, lambda: generate_fiche(get_model(), source, cycle_short, cache, model_name, consume_stream,
+                                    trace)
+    )
+    if trace is not None:
+        trace.set("cache_hit", hit)
+    return text, docx_bytes, hit
+
+
+def cached_fiches(get_model, source, cycles, cache, model_name, consume_streams=None, trace=None):
+    """Fiches de plusieurs niveaux pour un même texte support, générées en parallèle.
+
+    Le texte support n'est extrait qu'une fois (`source`) et les appels au
+    modèle partent ensemble : la durée est proche de celle d'une seule fiche.
+    `consume_streams` : {niveau: consume_stream}. Renvoie {niveau: (texte,
+    octets du .docx, trouvée en cache)}.
+    """
+    consume_streams = consume_streams or {}
+
+    def one(cycle_short):
+        return cycle_short, cached_fiche(get_model, source, cycle_short, cache, model_name,
+                                         consume_streams.get(cycle_short), trace)
+
+    if len(cycles) == 1:
+        return dict([one(cycles[0])])
+    with ThreadPoolExecutor(max_workers=len(cycles), thread_name_prefix="adc-cycle") as pool:
+        return dict(pool.map(one, cycles))
+
+
+def warm_up(model_backend="gemini"):
+    """Charge d'avance les bibliothèques lourdes et le gabarit Word.
+
+    Appelée une fois par processus, en tâche de fond : la première
+    génération ne paie plus ces imports.
+    """
+    import pymupdf  # noqa: F401
+    import adc.images  # noqa: F401  Pillow
+    create_adc_docx_final("", "Cycle 2")
+    if model_backend == "gemini":
+        import google.generativeai  # noqa: F401
@@ -0,0 +1,241 @@
+"""Politique d'appel au modèle : routage par taille, délai maximal, requête de couverture.
+
+Quelques réponses lentes font la latence ressentie (p99 plusieurs fois la
+médiane). Un appel qui dépasse le p95 appris pour sa route est doublé d'une
+requête de couverture : la première réponse complète et valide l'emporte,
+l'autre est abandonnée. Un appel sans réponse au bout du délai maximal
+échoue en DeadlineExceeded, que l'ordonnanceur reprend comme une erreur
+transitoire. Le routage envoie les textes tapés courts à un modèle plus
+léger et les scans de plusieurs pages au modèle le plus fort.
+"""
+import collections
+import queue
+import threading
+import time
+
+from adc.scheduler import estimate_prompt_tokens
+
+
+class DeadlineExceeded(Exception):
+    """Aucune réponse valide dans le délai : erreur transitoire, l'appel est repris."""
+
+
+class InvalidResponse(Exception):
+    """Réponse vide ou bloquée."""
+
+
+def route_by_size(prompt_parts, light_tokens=2000, strong_pages=3):
+    """Texte seul et court → "light" ; au moins `strong_pages` images → "strong"."""
+    images = sum(1 for part in prompt_parts if not isinstance(part, str))
+    if images >= strong_pages:
+        return "strong"
+    if not images and estimate_prompt_tokens(prompt_parts) <= light_tokens:
+        return "light"
+    return "default"
+
+
+class RoutedModel:
+    """Client qui confie chaque appel au modèle de sa route (`models` : {route: client}).
+
+    Une route absente de `models` retombe sur "default". Un texte support
+    mis en cache de contexte est routé à son dépôt, sur son contenu : les
+    appels qui y font référence vont au même modèle.
+    """
+
+    def __init__(self, models, route=route_by_size, max_contexts=1024):
+        self.models = models
+        self.route = route
+        self.max_contexts = max_contexts
+        self._context_routes = {}
+
+    def route_for(self, prompt_parts, context=None):
+        if context is not None:
+            return self._context_routes.get(context, "default")
+        route = self.route(prompt_parts)
+        return route if route in self.models else "default"
+
+    def generate_content(self, prompt_parts, stream=False, context=None, **kwargs):
+        model = self.models[self.route_for(prompt_parts, context)]
+        if context is not None:
+            kwargs["context"] = context
+        return model.generate_content(prompt_parts, stream=stream, **kwargs)
+
+    def cache_context(self, parts, ttl):
+        route = self.route_for(parts)
+        name = self.models[route].cache_context(parts, ttl)
+        self._context_routes[name] = route
+        while len(self._context_routes) > self.max_contexts:
+            self._context_routes.pop(next(iter(self._context_routes)))
+        return name
+
+
+class RequestPolicy:
+    """Réglages et latences apprises, partagés par tout le processus.
+
+    `deadline` : délai maximal d'un appel (secondes) ; `hedge_quantile` :
+    quantile des latences récentes au-delà duquel l'appel est doublé, appris
+    par route sur les `window` derniers appels dès `min_samples` mesures ;
+    `hedge_budget` : part maximale d'appels doublés, pour que la couverture
+    n'emballe pas la charge quand tout ralentit ; `route_for(parts, context)`
+    : route d'un appel (RoutedModel.route_for), qui sépare les latences.
+    """
+
+    def __init__(self, deadline=120.0, hedge_quantile=95, hedge_budget=0.1, window=200, min_samples=20,
+                 route_for=None):
+        self.deadline = deadline
+        self.hedge_quantile = hedge_quantile
+        self.hedge_budget = hedge_budget
+        self.min_samples = min_samples
+        self.route_for = route_for or (lambda prompt_parts, context=None: "default")
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._calls = 0
+        self._hedges = 0
+        self._lock = threading.Lock()
+
+    def observe(self, key, seconds):
+        with self._lock:
+            self._latencies[key].append(seconds)
+
+    def hedge_delay(self, key):
+        """Délai avant la requête de couverture, ou None tant que la route est mal connue."""
+        with self._lock:
+            samples = sorted(self._latencies[key])
+        if not self.hedge_budget or len(samples) < self.min_samples:
+            return None
+        return samples[max(0, round(self.hedge_quantile / 100 * len(samples)) - 1)]
+
+    def start_call(self):
+        with self._lock:
+            self._calls += 1
+
+    def allow_hedge(self):
+        with self._lock:
+            if self._hedges >= self.hedge_budget * self._calls:
+                return False
+            self._hedges += 1
+            return True
+
+
+class _Stream:
+    """Flux gagnant : premier morceau déjà lu, puis la suite de la réponse."""
+
+    def __init__(self, response, iterator, first):
+        self.response = response
+        self._iterator = iterator
+        self._first = first
+
+    def __iter__(self):
+        yield self._first
+        yield from self._iterator
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+def _full_response(response):
+    if not response.text:
+        raise InvalidResponse("réponse vide du modèle")
+    return response
+
+
+def _first_chunk(response):
+    iterator = iter(response)
+    for chunk in iterator:
+        return _Stream(response, iterator, chunk)
+    raise InvalidResponse("réponse vide du modèle")
+
+
+def _discard(result):
+    # Flux perdant : le fermer libère la connexion (et clôt sa mesure dans la trace)
+    if isinstance(result, _Stream) and hasattr(result._iterator, "close"):
+        result._iterator.close()
+
+
+class HedgedModel:
+    """Enveloppe un modèle pour appliquer une RequestPolicy à chaque `generate_content`.
+
+    À placer sous l'ordonnanceur, au-dessus de la mesure : une requête de
+    couverture occupe la place de l'appel dans la file et compte dans la
+    trace (`hedges`, `hedge_wins`). En flux, la course porte sur le premier
+    morceau. Un appel du SDK ne s'annule pas : le perdant se termine en
+    arrière-plan et sa réponse est ignorée.
+    """
+
+    def __init__(self, model, policy, trace=None):
+        self.model = model
+        self.policy = policy
+        self.trace = trace
+
+    def generate_content(self, prompt_parts, stream=False, **kwargs):
+        route = self.policy.route_for(prompt_parts, kwargs.get("context"))
+        if self.trace is not None:
+            self.trace.set("route", route)
+        return self._race(
+            (route, "stream" if stream else "full"),
+            lambda: self.model.generate_content(prompt_parts, stream=stream, **kwargs),
+            _first_chunk if stream else _full_response,
+        )
+
+    def _race(self, key, call, ready):
+        self.policy.start_call()
+        started = time.monotonic()
+        deadline = started + self.policy.deadline
+        hedge_at = self.policy.hedge_delay(key)
+        results = queue.Queue()
+        lock = threading.Lock()
+        settled = []
+
+        def attempt(index):
+            t0 = time.monotonic()
+            try:
+                outcome = (ready(call()), None)
+            except Exception as e:
+                outcome = (None, e)
+            with lock:
+                if settled:
+                    _discard(outcome[0])
+                    return
+                results.put((index, *outcome, time.monotonic() - t0))
+
+        def launch(index):
+            threading.Thread(target=attempt, args=(index,), daemon=True, name="adc-call").start()
+
+        launch(0)
+        launched, failed = 1, []
+        while True:
+            now = time.monotonic()
+            wait = deadline - now
+            if hedge_at is not None and launched == 1:
+                wait = min(wait, started + hedge_at - now)
+            if wait <= 0:
+                if now >= deadline:
+                    with lock:
+                        settled.append(None)
+                    raise DeadlineExceeded(f"pas de réponse du modèle en {self.policy.deadline:g} s")
+                hedge_at = None
+                if self.policy.allow_hedge():
+                    launch(1)
+                    launched += 1
+                    if self.trace is not None:
+                        self.trace.count("hedges")
+                continue
+            try:
+                index, result, error, elapsed = results.get(timeout=wait)
+            except queue.Empty:
+                continue
+            if error is not None:
+                failed.append(error)
+                if len(failed) == launched:
+                    raise failed[0]
+                continue
+            with lock:
+                settled.append(index)
+                while not results.empty():
+                    _discard(results.get()[1])
+            self.policy.observe(key, elapsed)
+            if index:
+                # L'appel initial n'a pas répondu : sa latence est au moins celle-ci
+                self.policy.observe(key, time.monotonic() - started)
+                if self.trace is not None:
+                    self.trace.count("hedge_wins")
+            return result
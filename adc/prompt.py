@@ -0,0 +1,98 @@
+"""Prompts envoyés au modèle pour produire la fiche ADC."""
+
+# À incrémenter à chaque modification d'un prompt : invalide le cache des fiches
+PROMPT_VERSION = "2"
+
+FICHE_STRUCTURE = """Structure obligatoire :
+1. TITRE & INFORMATIONS — niveau, durée estimée, organisation de classe
+2. OBJECTIFS DE COMPRÉHENSION — identifie 3 à 5 obstacles SPÉCIFIQUES au texte fourni (lexique opaque, chaînes anaphoriques, implicite culturel ou énonciatif, inférences nécessaires)
+3. DÉROULÉ EN 4 PHASES :
+   - Phase 1 : Lecture individuelle silencieuse
+   - Phase 2 : Tableau collaboratif avec exactement ces colonnes : "Ce qu'on sait" | "Ce qu'on ne sait pas" | "On n'est pas d'accord" — pré-rempli avec 3-4 exemples tirés du texte
+   - Phase 3 : Mise en commun et résolution collective
+   - Phase 4 : Retour sur les stratégies de compréhension mobilisées
+4. QUESTIONS-CLÉS — 5 questions de compréhension fine à poser à la classe, du littéral à l'inférentiel
+5. POINTS DE VIGILANCE — erreurs fréquentes à anticiper pour ce texte précis
+"""
+
+
+def fiche_prompt(cycle_short):
+    return f"""Agis en tant qu'expert pédagogique spécialisé en enseignement de la compréhension de texte.
+Rédige une fiche enseignant SYNTHÉTIQUE (2 pages maximum) pour un Atelier de Compréhension (ADC) pour le {cycle_short}.
+
+{FICHE_STRUCTURE}
+Sois précis, pratico-pratique. Évite les généralités. Tout doit être ancré dans le texte fourni.
+"""
+
+
+def chunk_analysis_prompt(cycle_short, index, total):
+    return f"""Agis en tant qu'expert pédagogique spécialisé en enseignement de la compréhension de texte.
+Voici l'extrait {index} sur {total} d'un texte long destiné à des élèves de {cycle_short}.
+Les extraits se chevauchent légèrement : ne traite que ce qui figure dans celui-ci.
+
+Relève, sous forme de listes courtes et en citant le texte :
+- LEXIQUE — mots ou expressions opaques pour ce niveau
+- ANAPHORES — chaînes de reprises (pronoms, substituts) susceptibles d'égarer le lecteur
+- IMPLICITE — informations à inférer, implicite culturel ou énonciatif
+- DÉSACCORDS POSSIBLES — passages ambigus qui peuvent faire débat en classe
+- QUESTIONS — 2 questions de compréhension fine ancrées dans cet extrait
+
+Sois bref : ces notes serviront à rédiger une fiche de synthèse, pas à être lues par l'enseignant.
+"""
+
+
+def analysis_notes(analyses):
+    return "\n\n".join(
+        f"--- Notes sur l'extrait {i} sur {len(analyses)} ---\n{analysis}"
+        for i, analysis in enumerate(analyses, start=1)
+    )
+
+
+def synthesis_prompt(cycle_short, analyses):
+    notes = analysis_notes(analyses)
+    return f"""Agis en tant qu'expert pédagogique spécialisé en enseignement de la compréhension de texte.
+Rédige une fiche enseignant SYNTHÉTIQUE (2 pages maximum) pour un Atelier de Compréhension (ADC) pour le {cycle_short}.
+Le texte support est long : il a été analysé extrait par extrait. Appuie-toi uniquement sur les notes ci-dessous,
+retiens les obstacles les plus importants pour l'ensemble du texte et évite les doublons liés au chevauchement des extraits.
+
+{FICHE_STRUCTURE}
+Sois précis, pratico-pratique. Évite les généralités. Tout doit être ancré dans le texte analysé.
+
+{notes}
+"""
+
+
+def section_prompt(cycle_short, section_title, kept_sections):
+    return f"""Agis en tant qu'expert pédagogique spécialisé en enseignement de la compréhension de texte.
+Voici une fiche enseignant d'Atelier de Compréhension (ADC) pour le {cycle_short}, dont une section est à réécrire.
+Rédige uniquement la section « {section_title} », en commençant par ce titre, dans le même format que les autres sections.
+N'écris rien avant ni après, et ne répète pas les autres sections : elles sont conservées telles quelles.
+
+{FICHE_STRUCTURE}
+Sois précis, pratico-pratique. Évite les généralités. Tout doit être ancré dans le texte fourni
+et cohérent avec les sections conservées.
+
+--- Sections conservées ---
+{kept_sections}
+"""
+
+
+def repair_prompt(cycle_short, problems, kept_sections):
+    """`problems` : {titre de section: [problèmes relevés]}."""
+    issues = "\n".join(f"- {title} : {' ; '.join(found)}" for title, found in problems.items())
+    titles = ", ".join(f"« {title} »" for title in problems)
+    return f"""Agis en tant qu'expert pédagogique spécialisé en enseignement de la compréhension de texte.
+Voici une fiche enseignant d'Atelier de Compréhension (ADC) pour le {cycle_short} dont certaines sections
+ne respectent pas la structure obligatoire :
+{issues}
+
+Rédige uniquement les sections {titles}, chacune en commençant par son titre numéroté, dans l'ordre.
+N'écris rien avant ni après, et ne répète pas les autres sections : elles sont conservées telles quelles.
+
+{FICHE_STRUCTURE}
+Sois précis, pratico-pratique. Évite les généralités. Tout doit être ancré dans le texte fourni
+et cohérent avec les sections conservées.
+
+--- Sections conservées ---
+{kept_sections}
+"""
@@ -0,0 +1,176 @@
+"""Compilation de la fiche (Markdown produit par le modèle) en document Word."""
+import collections
+import copy
+import io
+import re
+import threading
+
+from adc.sections import section_number, split_sections
+
+# python-docx n'est importé qu'au premier rendu : l'interface démarre sans lui
+
+# À incrémenter quand le rendu change : les .docx en cache sont alors reconstruits
+RENDER_VERSION = "3"
+
+HEADING = re.compile(r"^(#{1,6})\s*(.*)$")
+PHASE = re.compile(r"^[#*\s]*phase\s*\d", re.IGNORECASE)
+BULLET = re.compile(r"^[-*•]\s+(.*)$")
+TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?$")
+INLINE = re.compile(r"(\*\*.+?\*\*|__.+?__|\*[^*\s][^*]*?\*)")
+
+_template = None
+_template_lock = threading.Lock()
+
+# Éléments Word déjà rendus, par texte de section (les plus récents)
+MAX_CACHED_SECTIONS = 128
+_sections = collections.OrderedDict()
+_sections_lock = threading.Lock()
+
+
+def _template_bytes():
+    # Gabarit stylé construit une fois par processus, puis rechargé à chaque fiche
+    from docx import Document
+    from docx.shared import Pt, Cm
+
+    global _template
+    with _template_lock:
+        if _template is None:
+            doc = Document()
+            for section in doc.sections:
+                section.top_margin, section.bottom_margin = Cm(1.2), Cm(1.2)
+                section.left_margin, section.right_margin = Cm(1.5), Cm(1.5)
+            doc.styles['Normal'].font.name = 'Calibri'
+            doc.styles['Normal'].font.size = Pt(11)
+            buffer = io.BytesIO()
+            doc.save(buffer)
+            _template = buffer.getvalue()
+        return _template
+
+
+def add_inline(paragraph, text):
+    # **gras** et *italique* ; le reste est du texte brut
+    for token in INLINE.split(text):
+        if not token:
+            continue
+        if token.startswith(("**", "__")) and len(token) > 4:
+            paragraph.add_run(token[2:-2]).bold = True
+        elif token.startswith("*") and token.endswith("*") and len(token) > 2:
+            paragraph.add_run(token[1:-1]).italic = True
+        else:
+            paragraph.add_run(token)
+
+
+def _strip_markup(text):
+    return text.replace("**", "").replace("__", "").strip(" *#")
+
+
+def _table_cells(line):
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def _is_table_row(line):
+    return line.count("|") >= 2 or (line.startswith("|") and "|" in line[1:])
+
+
+def _add_table(doc, rows):
+    cols = max(len(row) for row in rows)
+    table = doc.add_table(rows=len(rows), cols=cols)
+    table.style = 'Table Grid'
+    for r, row in enumerate(rows):
+        cells = table.rows[r].cells
+        for c in range(cols):
+            paragraph = cells[c].paragraphs[0]
+            text = row[c] if c < len(row) else ""
+            if r == 0:
+                paragraph.add_run(_strip_markup(text)).bold = True
+            else:
+                add_inline(paragraph, text)
+
+
+def _render_lines(doc, text_content):
+    """Une seule passe sur les lignes ; les lignes de tableau consécutives
+    forment un seul tableau (la première est l'en-tête).
+
+    Titres et phases passent avant les tableaux : « Phase 2 : Tableau
+    collaboratif — "Ce qu'on sait" | … » reste un titre. Un titre de section
+    suit la règle du découpage (adc.sections.section_number) : « **1. Qui
+    sont les personnages ?** » dans les questions-clés reste un paragraphe.
+    """
+    table_rows = []
+    current = 0
+    for line in text_content.split('\n'):
+        clean_line = line.strip()
+        heading = HEADING.match(clean_line)
+        section = section_number(clean_line, current)
+        phase = PHASE.match(clean_line)
+
+        if clean_line and not (heading or section or phase) and _is_table_row(clean_line):
+            if not TABLE_SEPARATOR.match(clean_line):
+                table_rows.append(_table_cells(clean_line))
+            continue
+        if table_rows:
+            _add_table(doc, table_rows)
+            table_rows = []
+        if not clean_line or set(clean_line) <= set("-*_="):
+            continue
+
+        if section:
+            current = section
+        if heading:
+            level = 1 if len(heading.group(1)) <= 2 else 2
+            if PHASE.match(heading.group(2)):
+                level = 2
+            doc.add_heading(_strip_markup(heading.group(2)), level=level)
+        elif section:
+            doc.add_heading(_strip_markup(clean_line), level=1)
+        elif phase:
+            doc.add_heading(_strip_markup(clean_line), level=2)
+        elif BULLET.match(clean_line):
+            add_inline(doc.add_paragraph(style='List Bullet'), BULLET.match(clean_line).group(1))
+        else:
+            add_inline(doc.add_paragraph(), clean_line)
+
+    if table_rows:
+        _add_table(doc, table_rows)
+
+
+def _section_elements(text):
+    # Rendue une fois dans un document brouillon tiré du même gabarit (mêmes
+    # styles, même numérotation), la section est ensuite recopiée telle quelle.
+    with _sections_lock:
+        if text in _sections:
+            _sections.move_to_end(text)
+            return _sections[text]
+    from docx import Document
+
+    scratch = Document(io.BytesIO(_template_bytes()))
+    body = scratch.element.body
+    start = len(body) - 1  # avant le w:sectPr final
+    _render_lines(scratch, text)
+    elements = list(body)[start:-1]
+    with _sections_lock:
+        _sections[text] = elements
+        while len(_sections) > MAX_CACHED_SECTIONS:
+            _sections.popitem(last=False)
+    return elements
+
+
+def create_adc_docx_final(text_content, cycle_name):
+    """Assemble le document section par section ; une section déjà rendue
+    (fiche dont une seule section a été régénérée) n'est pas recompilée."""
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    doc = Document(io.BytesIO(_template_bytes()))
+    title = doc.add_heading(f"FICHE ENSEIGNANT : ATELIER DE COMPRÉHENSION — {cycle_name}", 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    sect_pr = doc.element.body[-1]
+    for _, section_text in split_sections(text_content):
+        for element in _section_elements(section_text):
+            sect_pr.addprevious(copy.deepcopy(element))
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,230 @@
+"""Ordonnanceur partagé des appels au modèle : débit, file d'attente, reprises.
+
+Un seul ordonnanceur par processus : toutes les sessions passent par la même
+file, dans l'ordre d'arrivée, sous un plafond de requêtes et de tokens par
+minute et un nombre maximal d'appels simultanés. Les erreurs transitoires
+(429, 5xx, délai dépassé) sont retentées avec un délai exponentiel aléatoire.
+"""
+import collections
+import random
+import threading
+import time
+
+from adc.extraction import IMAGE_TILE, estimate_image_tokens, estimate_text_tokens
+
+TRANSIENT_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "ServerError",
+}
+TRANSIENT_CODES = {429, 500, 502, 503, 504}
+
+
+class QueueFull(Exception):
+    """La file d'attente est pleine ; le message est destiné à l'utilisateur."""
+
+
+def is_transient(error):
+    code = getattr(error, "code", None)
+    code = getattr(code, "value", code)
+    return type(error).__name__ in TRANSIENT_NAMES or code in TRANSIENT_CODES
+
+
+def estimate_prompt_tokens(prompt_parts):
+    tokens = 0
+    for part in prompt_parts:
+        if isinstance(part, str):
+            tokens += estimate_text_tokens(part)
+        else:
+            # Dimensions inconnues sans décoder : on compte une page de 2×2 tuiles
+            tokens += estimate_image_tokens(2 * IMAGE_TILE, 2 * IMAGE_TILE)
+    return tokens
+
+
+class TokenBucket:
+    """Seau à jetons rechargé en continu ; `per_minute` à 0 : illimité."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount, now):
+        if self.capacity:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+
+class ModelScheduler:
+    def __init__(self, requests_per_minute=60, tokens_per_minute=1_000_000, max_concurrent=8,
+                 max_queue=50, max_retries=4, base_delay=1.0, max_delay=30.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._queue = collections.deque()
+        self._active = 0
+        self._cond = threading.Condition()
+
+    @property
+    def waiting(self):
+        return len(self._queue)
+
+    def _acquire(self, tokens, on_position):
+        with self._cond:
+            if self.max_queue and len(self._queue) >= self.max_queue:
+                raise QueueFull("le service est très sollicité. Réessayez dans une minute.")
+            ticket = object()
+            self._queue.append(ticket)
+            shown = None
+            try:
+                while True:
+                    position = self._queue.index(ticket)
+                    wait = 0.5
+                    if position == 0 and self._active < self.max_concurrent:
+                        now = time.monotonic()
+                        wait = max(self.requests.delay(1, now), self.tokens.delay(tokens, now))
+                        if wait <= 0:
+                            break
+                    if on_position is not None and position + 1 != shown:
+                        shown = position + 1
+                        on_position(shown)
+                    self._cond.wait(timeout=min(wait, 0.5))
+                now = time.monotonic()
+                self.requests.take(1, now)
+                self.tokens.take(tokens, now)
+                self._active += 1
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+        # La place est prise : la position affichée n'a plus lieu d'être
+        if on_position is not None and shown is not None:
+            on_position(None)
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _backoff(self, attempt):
+        # « Full jitter » : évite que toutes les sessions refrappent ensemble
+        time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def _hold(self, call, tokens, on_position, on_wait):
+        # `call()` à son tour, avec reprises ; au retour, sa place est encore prise
+        for attempt in range(self.max_retries + 1):
+            waiting_since = time.monotonic()
+            self._acquire(tokens, on_position)
+            if on_wait is not None:
+                on_wait(time.monotonic() - waiting_since)
+            try:
+                return call()
+            except Exception as e:
+                self._release()
+                if attempt == self.max_retries or not is_transient(e):
+                    raise
+            self._backoff(attempt)
+
+    def run(self, call, tokens=0, on_position=None, on_wait=None):
+        """Exécute `call()` à son tour dans la file, avec reprises sur erreur transitoire.
+
+        `on_wait(secondes)` reçoit l'attente de chaque tentative dans la file.
+        """
+        result = self._hold(call, tokens, on_position, on_wait)
+        self._release()
+        return result
+
+    def stream(self, call, tokens=0, on_position=None, on_wait=None):
+        """Comme `run`, pour un appel en flux : la place n'est rendue qu'au bout du flux."""
+        return ScheduledStream(self, call, tokens, on_position, on_wait)
+
+
+class StreamRestart:
+    """Morceau spécial d'un flux repris après une erreur : le texte déjà reçu est à oublier."""
+
+    parts = ()
+    text = ""
+
+
+class ScheduledStream:
+    """Réponse en flux qui garde sa place dans l'ordonnanceur jusqu'à épuisement ou fermeture.
+
+    L'appel part dès la création (file, reprises avant le premier morceau). Une
+    erreur transitoire en cours de flux relance l'appel depuis le début : le
+    flux renvoie alors un StreamRestart avant les morceaux de la nouvelle réponse.
+    """
+
+    def __init__(self, scheduler, call, tokens, on_position, on_wait):
+        self.scheduler = scheduler
+        self._call = lambda: scheduler._hold(call, tokens, on_position, on_wait)
+        self._held = False
+        self.response = None
+        self.response = self._call()
+        self._held = True
+
+    def __iter__(self):
+        try:
+            for attempt in range(self.scheduler.max_retries + 1):
+                try:
+                    yield from self.response
+                    return
+                except Exception as e:
+                    if attempt == self.scheduler.max_retries or not is_transient(e):
+                        raise
+                self._release()
+                self.scheduler._backoff(attempt)
+                self.response = self._call()
+                self._held = True
+                yield StreamRestart()
+        finally:
+            self.close()
+
+    def _release(self):
+        if self._held:
+            self._held = False
+            self.scheduler._release()
+
+    def close(self):
+        self._release()
+
+    def __del__(self):
+        # Flux abandonné sans être lu jusqu'au bout : la place ne doit pas rester prise
+        self._release()
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+class ScheduledModel:
+    """Enveloppe un modèle pour que chaque `generate_content` passe par l'ordonnanceur.
+
+    `on_position(n)` est appelé tant que l'appel attend, avec sa place dans la file ;
+    si `trace` (adc.metrics.Trace) est fourni, l'attente s'y ajoute à l'étape "queue".
+    En flux, la place est gardée jusqu'à la fin de la réponse (ScheduledStream).
+    """
+
+    def __init__(self, model, scheduler, on_position=None, trace=None):
+        self.model = model
+        self.scheduler = scheduler
+        self.on_position = on_position
+        self.trace = trace
+
+    def generate_content(self, prompt_parts, stream=False, **kwargs):
+        on_wait = None if self.trace is None else (lambda seconds: self.trace.add_time("queue", seconds))
+        run = self.scheduler.stream if stream else self.scheduler.run
+        return run(lambda: self.model.generate_content(prompt_parts, stream=stream, **kwargs),
+                   estimate_prompt_tokens(prompt_parts), self.on_position, on_wait)
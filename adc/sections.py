@@ -0,0 +1,112 @@
+"""Découpage d'une fiche en sections adressables : les cinq de la structure imposée.
+
+Le découpage conserve le texte à l'identique : recoller les sections redonne
+la fiche d'origine, et une section peut être remplacée sans toucher aux autres.
+"""
+import re
+import unicodedata
+
+SECTION_TITLES = {
+    "infos": "1. TITRE & INFORMATIONS",
+    "objectifs": "2. OBJECTIFS DE COMPRÉHENSION",
+    "deroule": "3. DÉROULÉ EN 4 PHASES",
+    "questions": "4. QUESTIONS-CLÉS",
+    "vigilance": "5. POINTS DE VIGILANCE",
+}
+SECTION_KEYS = tuple(SECTION_TITLES)
+# Texte placé avant la première section (rare : phrase d'introduction du modèle)
+INTRO = "intro"
+
+# « ## 4. QUESTIONS-CLÉS », « **4) QUESTIONS-CLÉS** », « 4. QUESTIONS-CLÉS »
+SECTION_LINE = re.compile(r"^[#*\s]*([1-5])[.)]\s+(.+?)[*\s]*$")
+
+
+def is_upper_title(text):
+    # « OBJECTIFS DE COMPRÉHENSION » oui, « Q1 ? » ou « Qui est-ce ? » non
+    letters = [c for c in text if c.isalpha()]
+    return len(letters) >= 4 and all(c.isupper() for c in letters)
+
+
+def _first_word(text):
+    # Premier mot, sans casse ni accents : « Déroulé en 4 phases » → « deroule »
+    text = "".join(c for c in unicodedata.normalize("NFKD", text.casefold()) if not unicodedata.combining(c))
+    return re.match(r"[^a-z]*([a-z]*)", text).group(1)
+
+
+# Premier mot du titre de chaque section : « titre », « objectifs », « deroule »…
+TITLE_WORDS = {number: _first_word(title.split(" ", 1)[1])
+               for number, title in enumerate(SECTION_TITLES.values(), start=1)}
+
+
+def section_number(line, after=0):
+    """Numéro de la section que `line` ouvre, ou None.
+
+    Le titre doit commencer comme celui de la structure, casse et accents
+    ignorés (« 1. Titre & informations : … »), ou être en capitales, et
+    suivre la section `after` : « 5. Que pense l'auteur ? » dans les
+    questions-clés n'ouvre pas de section.
+    """
+    match = SECTION_LINE.match(line.strip())
+    if not match or int(match.group(1)) <= after:
+        return None
+    number, title = int(match.group(1)), match.group(2)
+    if _first_word(title) == TITLE_WORDS[number] or is_upper_title(title):
+        return number
+    return None
+
+
+def split_sections(text):
+    """[(clé, texte)] dans l'ordre ; le texte de chaque section inclut son titre."""
+    sections = []
+    key, start, number, offset = INTRO, 0, 0, 0
+    for line in text.splitlines(keepends=True):
+        found = section_number(line, number)
+        if found is not None:
+            if offset > start or key != INTRO:
+                sections.append((key, text[start:offset]))
+            key, start, number = SECTION_KEYS[found - 1], offset, found
+        offset += len(line)
+    if offset > start or key != INTRO:
+        sections.append((key, text[start:]))
+    return sections
+
+
+def has_intro(text):
+    """Texte non vide avant la première section reconnue (titre mal formé, ou phrase d'introduction)."""
+    return any(key == INTRO and section.strip() for key, section in split_sections(text))
+
+
+def join_sections(sections):
+    return "".join(text for _, text in sections)
+
+
+def extract_section(text, key):
+    """Texte de la section `key` dans une réponse du modèle, sans ce qui l'entoure.
+
+    Si le titre manque, la réponse entière est prise pour le corps de la section.
+    """
+    for found, section_text in split_sections(text):
+        if found == key:
+            return section_text.strip("\n") + "\n"
+    return f"## {SECTION_TITLES[key]}\n{text.strip()}\n"
+
+
+def replace_section(text, key, section_text):
+    """Fiche où la section `key` est remplacée (ou ajoutée à sa place si absente)."""
+    sections = split_sections(text)
+    section_text = section_text.rstrip("\n") + "\n\n"
+    for i, (found, _) in enumerate(sections):
+        if found == key:
+            sections[i] = (key, section_text)
+            return join_sections(sections)
+    order = SECTION_KEYS.index(key)
+    position = sum(1 for found, _ in sections if found == INTRO or SECTION_KEYS.index(found) < order)
+    if position and not sections[position - 1][1].endswith("\n\n"):
+        sections[position - 1] = (sections[position - 1][0], sections[position - 1][1].rstrip("\n") + "\n\n")
+    sections.insert(position, (key, section_text))
+    return join_sections(sections)
+
+
+def other_sections(text, *keys):
+    """La fiche sans les sections `keys` : contexte envoyé pour les régénérer."""
+    return join_sections([(found, section) for found, section in split_sections(text) if found not in keys])
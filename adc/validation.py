@@ -0,0 +1,96 @@
+"""Contrôle local de la structure d'une fiche, section par section.
+
+La structure attendue est celle qu'impose le prompt (FICHE_STRUCTURE) : cinq
+sections numérotées, les quatre phases du déroulé, le tableau à trois
+colonnes de la phase 2 et exactement cinq questions-clés. Chaque problème
+est rattaché à sa section : seules les sections fautives sont redemandées
+au modèle (adc.pipeline.repair_fiche).
+"""
+import re
+
+from adc.rendering import TABLE_SEPARATOR
+from adc.sections import SECTION_KEYS, split_sections
+
+PHASE_LINE = re.compile(r"^[#*\s]*phase\s*([1-4])\b", re.IGNORECASE)
+# « - obstacle », « 1. question », « Q1 : question » (emphase retirée)
+ITEM = re.compile(r"^(?:[-*•]\s+|(?:Q\s*)?\d+\s*[.):]\s*)\S", re.IGNORECASE)
+TABLE_COLUMNS = ("Ce qu'on sait", "Ce qu'on ne sait pas", "On n'est pas d'accord")
+QUESTIONS = 5
+MIN_OBSTACLES = 3
+MIN_TABLE_EXAMPLES = 3
+
+
+def _normalize(text):
+    text = text.replace("’", "'").replace("**", "").replace("__", "").strip(" *\"«»")
+    return " ".join(text.lower().split())
+
+
+def _body(section_text):
+    # Lignes non vides après le titre de section
+    return [line.rstrip() for line in section_text.splitlines()[1:] if line.strip()]
+
+
+def _items(lines):
+    # Puces ou numéros au premier niveau (sans retrait), « **1.** » ou « **Q1.** » compris
+    return [line for line in lines
+            if not line[0].isspace() and ITEM.match(line.replace("**", "").replace("__", "").lstrip("# "))]
+
+
+def _table(lines):
+    """Lignes du premier tableau (séparateur exclu), en cellules."""
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if line.count("|") >= 2:
+            if not TABLE_SEPARATOR.match(line):
+                rows.append([cell.strip() for cell in line.strip("|").split("|")])
+        elif rows:
+            break
+    return rows
+
+
+def _check_deroule(lines):
+    problems = []
+    phases = {int(m.group(1)) for m in map(PHASE_LINE.match, lines) if m}
+    problems += [f"phase {n} absente" for n in range(1, 5) if n not in phases]
+    # Le tableau suit le titre de la phase 2, qui reprend souvent les trois
+    # colonnes séparées par « | » : ce titre n'est pas l'en-tête du tableau
+    start = next((i + 1 for i, line in enumerate(lines) if (m := PHASE_LINE.match(line)) and m.group(1) == "2"),
+                 0)
+    rows = _table(lines[start:])
+    if not rows:
+        return problems + ["tableau de la phase 2 absent"]
+    header = [_normalize(cell) for cell in rows[0]]
+    if header != [_normalize(column) for column in TABLE_COLUMNS]:
+        problems.append("tableau de la phase 2 : colonnes attendues " + " | ".join(f"« {c} »" for c in TABLE_COLUMNS))
+    examples = [row for row in rows[1:] if any(cell for cell in row)]
+    if len(examples) < MIN_TABLE_EXAMPLES:
+        problems.append(f"tableau de la phase 2 : {len(examples)} exemple(s), {MIN_TABLE_EXAMPLES} au moins")
+    if any(len(row) != len(TABLE_COLUMNS) for row in examples):
+        problems.append("tableau de la phase 2 : lignes sans exactement trois cellules")
+    return problems
+
+
+def section_problems(key, section_text):
+    """Problèmes de structure de la section `key` (titre compris) ; [] si elle est conforme."""
+    lines = _body(section_text)
+    if not lines:
+        return ["section vide"]
+    if key == "objectifs" and len(_items(lines)) < MIN_OBSTACLES:
+        return [f"{MIN_OBSTACLES} obstacles au moins, un par puce"]
+    if key == "deroule":
+        return _check_deroule(lines)
+    if key == "questions" and len(_items(lines)) != QUESTIONS:
+        return [f"{len(_items(lines))} question(s) numérotée(s) au lieu de {QUESTIONS}"]
+    return []
+
+
+def validate_fiche(text):
+    """{clé de section: [problèmes]} pour les sections absentes ou non conformes, dans l'ordre."""
+    sections = dict(split_sections(text))
+    problems = {}
+    for key in SECTION_KEYS:
+        found = ["section absente"] if key not in sections else section_problems(key, sections[key])
+        if found:
+            problems[key] = found
+    return problems
@@ -1,11 +1,21 @@
 import streamlit as st
-import google.generativeai as genai
 import os
+import gc
+import hashlib
 import io
-import fitz  # PyMuPDF
-from docx import Document
-from docx.shared import Pt, Cm
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+import threading
+import zipfile
+from adc.cache import FicheCache
+from adc.context import ContextCache
+from adc.extraction import BudgetExceeded, IngestionBudget
+from adc.jobs import ACTIVE, FicheJobHandler, JobRunner, JobStore
+from adc.metrics import STAGES, MetricsRecorder, TracedModel, serve_metrics
+from adc.models import DEFAULT_MODEL, make_model
+from adc.pipeline import warm_up
+from adc.policy import HedgedModel, RequestPolicy, RoutedModel
+from adc.prompt import PROMPT_VERSION
+from adc.scheduler import ModelScheduler, QueueFull, ScheduledModel
+from adc.sections import SECTION_TITLES, split_sections
 
 # --- 1. CONFIGURATION ---
 st.set_page_config(
@@ -14,6 +24,143 @@ st.set_page_config(
     layout="centered"
 )
 
+# Backend du modèle : "gemini", ou "stub" pour un modèle factice local sans clé API
+MODEL_BACKEND = os.environ.get("ADC_MODEL_BACKEND", "gemini")
+# Modèle factice : délai (médian) avant le premier morceau et entre deux morceaux
+# (secondes), dispersion log-normale du délai, part et facteur des appels lents
+STUB_OPTIONS = {
+    "latency": float(os.environ.get("ADC_STUB_LATENCY", "1.0")),
+    "chunk_delay": float(os.environ.get("ADC_STUB_CHUNK_DELAY", "0.05")),
+    "latency_sigma": float(os.environ.get("ADC_STUB_LATENCY_SIGMA", "0")),
+    "slow_rate": float(os.environ.get("ADC_STUB_SLOW_RATE", "0")),
+    "slow_factor": float(os.environ.get("ADC_STUB_SLOW_FACTOR", "5")),
+}
+# Affichage progressif de la fiche pendant la génération (ADC_STREAMING=0 pour désactiver)
+STREAMING = os.environ.get("ADC_STREAMING", "1") != "0"
+# Nombre de fiches gardées en mémoire par session (une par fichier × niveau)
+MAX_SESSION_FICHES = 4
+# Niveaux générés ensemble pour une classe multiniveau
+CYCLES = ("Cycle 2", "Cycle 3")
+# Rendu des pages PDF scannées envoyées au modèle en image
+PDF_OPTIONS = {
+    "dpi": int(os.environ.get("ADC_PDF_DPI", "150")),
+    "grayscale": os.environ.get("ADC_PDF_GRAYSCALE", "1") != "0",
+    "image_format": os.environ.get("ADC_PDF_IMAGE_FORMAT", "jpeg"),
+    "quality": int(os.environ.get("ADC_PDF_IMAGE_QUALITY", "70")),
+    "workers": int(os.environ.get("ADC_RASTER_WORKERS", "0")) or None,
+}
+# Photos et scans JPG/PNG : redressés, recadrés, réduits puis réencodés
+IMAGE_OPTIONS = {
+    "max_edge": int(os.environ.get("ADC_IMAGE_MAX_EDGE", "1600")),
+    "grayscale": PDF_OPTIONS["grayscale"],
+    "image_format": PDF_OPTIONS["image_format"],
+    "quality": PDF_OPTIONS["quality"],
+}
+# Plafonds par génération : au-delà, message clair plutôt qu'un worker à court de mémoire
+MAX_UPLOAD_MB = int(os.environ.get("ADC_MAX_UPLOAD_MB", "20"))
+INGESTION_LIMITS = {
+    "max_bytes": MAX_UPLOAD_MB * 1024 * 1024,
+    "max_pages": int(os.environ.get("ADC_MAX_PAGES", "40")),
+    "max_tokens": int(os.environ.get("ADC_MAX_INPUT_TOKENS", "200000")),
+}
+# Plafond par session : octets des générations encore en cours d'un même onglet
+# (un enseignant qui relance avec d'autres fichiers sans attendre la fin)
+SESSION_MAX_BYTES = int(os.environ.get("ADC_MAX_SESSION_MB", "40")) * 1024 * 1024
+# Appels à Gemini pour tout le processus : débit, simultanéité, file, reprises
+SCHEDULER_LIMITS = {
+    "requests_per_minute": int(os.environ.get("ADC_RPM", "60")),
+    "tokens_per_minute": int(os.environ.get("ADC_TPM", "1000000")),
+    "max_concurrent": int(os.environ.get("ADC_MAX_CONCURRENT", "8")),
+    "max_queue": int(os.environ.get("ADC_MAX_QUEUE", "50")),
+    "max_retries": int(os.environ.get("ADC_MAX_RETRIES", "4")),
+}
+# Modèle selon la taille de l'entrée : texte tapé court → léger (ADC_MODEL_LIGHT, par
+# exemple gemini-2.5-flash-lite), scan de plusieurs pages → fort (variable vide : modèle par défaut)
+MODEL_ROUTES = {
+    "light": os.environ.get("ADC_MODEL_LIGHT", ""),
+    "default": DEFAULT_MODEL,
+    "strong": os.environ.get("ADC_MODEL_STRONG", DEFAULT_MODEL),
+}
+# Modèles des routes, dans la clé du cache et l'empreinte de session : changer un modèle
+# ne ressert pas les fiches d'un autre. Les fiches factices ne partagent rien avec les vraies.
+MODEL_NAMES = tuple(dict.fromkeys(name or DEFAULT_MODEL for name in MODEL_ROUTES.values()))
+MODEL_NAME = "+".join(MODEL_NAMES) if MODEL_BACKEND == "gemini" else f"{MODEL_BACKEND}:{'+'.join(MODEL_NAMES)}"
+# Délai maximal d'un appel, et part maximale d'appels doublés au-delà du p95 appris
+REQUEST_POLICY = {
+    "deadline": float(os.environ.get("ADC_DEADLINE", "120")),
+    "hedge_budget": float(os.environ.get("ADC_HEDGE_BUDGET", "0.1")),
+}
+# Texte support gardé dans le cache de contexte du modèle (secondes, 0 pour désactiver) :
+# reprendre le même document pour l'autre niveau ou une section ne le renvoie pas
+CONTEXT_TTL = int(os.environ.get("ADC_CONTEXT_TTL", "900"))
+# Mesures par génération : traces JSON et métriques Prometheus dans ADC_METRICS_DIR,
+# servies sur http://127.0.0.1:ADC_METRICS_PORT/metrics si le port est défini
+METRICS_PORT = int(os.environ.get("ADC_METRICS_PORT", "0"))
+# Panneau de mesures sous la fiche (ADC_DEBUG=1, ou ?debug=1 dans l'adresse)
+DEBUG_PANEL = os.environ.get("ADC_DEBUG", "0") == "1"
+
+
+@st.cache_resource
+def get_fiche_cache():
+    return FicheCache(
+        os.environ.get("ADC_CACHE_DIR", ".adc_cache"),
+        max_bytes=int(os.environ.get("ADC_CACHE_MAX_MB", "200")) * 1024 * 1024,
+        max_age=int(os.environ.get("ADC_CACHE_MAX_DAYS", "30")) * 24 * 3600,
+    )
+
+
+@st.cache_resource
+def get_scheduler():
+    return ModelScheduler(**SCHEDULER_LIMITS)
+
+
+@st.cache_resource
+def get_metrics():
+    recorder = MetricsRecorder(os.environ.get("ADC_METRICS_DIR", ".adc_metrics"))
+    if METRICS_PORT:
+        serve_metrics(recorder, METRICS_PORT)
+    return recorder
+
+
+def warm_up_and_freeze():
+    warm_up(MODEL_BACKEND)
+    # Les modules chargés (protobuf et grpc avec Gemini) vivent autant que le
+    # processus : parcourus à chaque passage du ramasse-miettes, ils coûtent
+    # ~40 ms par rerun. On ramasse d'abord les cycles morts à cet instant
+    # (dont ceux du premier rerun), puis on sort les survivants du
+    # ramasse-miettes pour de bon (gc.freeze).
+    gc.collect()
+    gc.freeze()
+
+
+@st.cache_resource
+def warm_up_once():
+    thread = threading.Thread(target=warm_up_and_freeze, daemon=True, name="adc-warm-up")
+    thread.start()
+    return thread
+
+
+@st.cache_resource
+def get_job_runner(api_key):
+    # Clients Gemini, latences apprises et file d'attente partagés par toutes
+    # les sessions ; au premier appel, les tâches interrompues par un
+    # redémarrage reprennent.
+    clients = {name: make_model(MODEL_BACKEND, api_key, name, **STUB_OPTIONS) for name in MODEL_NAMES}
+    client = RoutedModel({route: clients[name or DEFAULT_MODEL] for route, name in MODEL_ROUTES.items()})
+    policy = RequestPolicy(route_for=client.route_for, **REQUEST_POLICY)
+    scheduler = get_scheduler()
+    handler = FicheJobHandler(
+        lambda on_position, trace: ScheduledModel(HedgedModel(TracedModel(client, trace), policy, trace),
+                                                  scheduler, on_position, trace),
+        get_fiche_cache(), MODEL_NAME, INGESTION_LIMITS, IMAGE_OPTIONS, PDF_OPTIONS, streaming=STREAMING,
+        metrics=get_metrics(), contexts=ContextCache(client, CONTEXT_TTL, scheduler=scheduler) if CONTEXT_TTL else None,
+    )
+    store = JobStore(os.environ.get("ADC_JOBS_DB", ".adc_jobs.sqlite3"))
+    # Tâches en attente d'un worker : même plafond que la file de l'ordonnanceur
+    return JobRunner(store, handler, workers=int(os.environ.get("ADC_JOB_WORKERS", "8")),
+                     max_pending=SCHEDULER_LIMITS["max_queue"])
+
+
 # --- CSS ACCESSIBLE + DESIGN DISTINCTIF ---
 # Palette : bleu encre profond (#1B2A4A) / crème chaud (#F7F3EC) / ambre (#C17D00)
 # Contraste testé : texte foncé sur crème → 12.5:1 / ambre sur fond sombre → 4.8:1
@@ -339,46 +486,133 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# --- 2. MOTEUR DE RENDU WORD ---
-def create_adc_docx_final(text_content, cycle_name):
-    doc = Document()
-    for section in doc.sections:
-        section.top_margin, section.bottom_margin = Cm(1.2), Cm(1.2)
-        section.left_margin, section.right_margin = Cm(1.5), Cm(1.5)
-
-    doc.styles['Normal'].font.name = 'Calibri'
-    doc.styles['Normal'].font.size = Pt(11)
-    title = doc.add_heading(f"FICHE ENSEIGNANT : ATELIER DE COMPRÉHENSION — {cycle_name}", 0)
-    title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-    for line in text_content.split('\n'):
-        clean_line = line.strip()
-        if not clean_line:
-            continue
-        if clean_line.startswith(('#', '1.', '2.', '3.', '4.', '5.')) or "PHASE" in clean_line.upper():
-            doc.add_heading(clean_line.replace('#', '').strip(), level=1)
-        elif "|" in clean_line and "---" not in clean_line:
-            parts = [p.strip() for p in clean_line.split("|") if p.strip()]
-            if len(parts) >= 2:
-                table = doc.add_table(rows=1, cols=len(parts))
-                table.style = 'Table Grid'
-                for i, part in enumerate(parts):
-                    table.rows[0].cells[i].text = part
-        elif '**' in clean_line:
-            p = doc.add_paragraph()
-            for i, part in enumerate(clean_line.split('**')):
-                run = p.add_run(part)
-                if i % 2 != 0:
-                    run.bold = True
-        elif clean_line.startswith(('-', '*', '•')):
-            doc.add_paragraph(clean_line.strip('-*• ').strip(), style='List Bullet')
-        else:
-            doc.add_paragraph(clean_line)
+# --- 2. RENDU DE LA FICHE À L'ÉCRAN ---
+def fiche_html(text, in_progress=False, label="Fiche ADC générée"):
+    # aria-live : les lecteurs d'écran annoncent les sections au fil de l'eau
+    busy = ' aria-busy="true"' if in_progress else ''
+    return (
+        f'<div class="output-zone" role="region" aria-label="{label}" aria-live="polite"{busy}>'
+        f'{text.replace(chr(10), "<br>")}'
+        f'</div>'
+    )
+
+
+def input_fingerprint(file_bytes, cycle_short):
+    h = hashlib.sha256(file_bytes)
+    h.update(f"\0{cycle_short}\0{PROMPT_VERSION}\0{MODEL_NAME}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def check_upload(store, size):
+    """Refuse un dépôt avant qu'il soit gardé en base : fichier trop gros
+    (BudgetExceeded) ou session dont les générations en cours pèsent déjà trop
+    (QueueFull : il suffit d'attendre)."""
+    IngestionBudget(**INGESTION_LIMITS).check_bytes(size)
+    inflight = st.session_state.setdefault("inflight_bytes", {})
+    for job_id in list(inflight):
+        if not any(job["status"] in ACTIVE for job in store.get_group(job_id)):
+            del inflight[job_id]
+    if SESSION_MAX_BYTES and sum(inflight.values()) + size > SESSION_MAX_BYTES:
+        raise QueueFull(f"vos générations en cours totalisent {sum(inflight.values()) / 1024 / 1024:.1f} Mo, "
+                        f"la limite par session est de {SESSION_MAX_BYTES / 1024 / 1024:.0f} Mo. "
+                        "Attendez qu'elles se terminent.")
+
+
+def remember_upload(job_id, size):
+    st.session_state.setdefault("inflight_bytes", {})[job_id] = size
+
+
+def remember_fiche(fiches, fingerprint, text, docx_bytes, cycle_short, job_id=None):
+    # `job` : tâche qui a produit cette version (fiche complète ou section régénérée)
+    fiche = {"fingerprint": fingerprint, "text": text, "docx": docx_bytes, "cycle": cycle_short, "job": job_id}
+    fiches[fingerprint] = fiche
+    while len(fiches) > MAX_SESSION_FICHES:
+        fiches.pop(next(iter(fiches)))
+    st.session_state["fiche_last"] = fingerprint
+    return fiche
+
+
+def fiche_file_name(fiche):
+    return f"Fiche_ADC_{fiche['cycle'].replace(' ', '_')}.docx"
+
 
+def download_fiche(fiche, label="↓ Télécharger la fiche (Word .docx)"):
+    st.download_button(
+        label=label,
+        data=fiche["docx"],
+        file_name=fiche_file_name(fiche),
+        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        on_click="ignore",
+        use_container_width=True
+    )
+
+
+def fiches_zip(shown):
+    # Les .docx sont déjà compressés : archivés tels quels
     buffer = io.BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for fiche in shown:
+            archive.writestr(fiche_file_name(fiche), fiche["docx"])
+    return buffer.getvalue()
+
+
+def submit_section(api_key, cycle_short, uploaded_file, fingerprint, base_text):
+    # Rappel du bouton : la tâche est déposée avant la réexécution, qui la suit ensuite
+    runner = get_job_runner(api_key)
+    try:
+        check_upload(runner.store, uploaded_file.size)
+        job_id = runner.submit(
+            cycle_short, uploaded_file.type, fingerprint, uploaded_file.getvalue(),
+            section=st.session_state["section_key"], base_text=base_text,
+        )
+    except BudgetExceeded as e:
+        st.session_state["too_large"] = str(e)
+        return
+    except QueueFull as e:
+        st.session_state["queue_full"] = str(e)
+        return
+    remember_upload(job_id, uploaded_file.size)
+    st.session_state["job_id"] = job_id
+    st.query_params["job"] = job_id
+
+
+RESULT_TITLE = '<h3 style="font-family:\'Fraunces\',Georgia,serif; color:#1B2A4A; font-size:1.1rem; margin:1.5rem 0 0.5rem;">📄 Fiche générée</h3>'
+RESULTS_TITLE = RESULT_TITLE.replace("Fiche générée", "Fiches générées")
+
+
+@st.fragment(run_every=1.0)
+def show_job_progress(job_id):
+    # Seul ce fragment est réexécuté chaque seconde tant que la tâche (ou le groupe) tourne
+    jobs = get_job_runner(os.environ.get("GEMINI_API_KEY")).store.get_group(job_id)
+    if not any(job["status"] in ACTIVE for job in jobs):
+        st.rerun()
+    # Texte support commun au groupe : mêmes indications pour toutes ses tâches
+    job = jobs[0]
+    if job["report"].get("tokens_saved", 0) > 0:
+        st.caption(f"Texte nettoyé avant analyse (en-têtes, numéros de page, césures) : "
+                   f"≈ {job['report']['tokens_saved']} tokens en moins.")
+    if job["report"].get("long_text"):
+        st.caption("Texte long : analyse par extraits en parallèle, puis synthèse de la fiche.")
+    if job["position"]:
+        st.info(f"⏳ File d'attente — votre demande est en position {job['position']}. "
+                f"La génération démarre automatiquement.")
+    elif not any(job["partial"] for job in jobs):
+        st.caption("⏳ Analyse pédagogique en cours…")
+    for job in jobs:
+        text = job["partial"] or job["text"]
+        if text:
+            if len(jobs) > 1:
+                st.markdown(f"**{job['cycle']}**")
+            st.markdown(fiche_html(text, in_progress=job["status"] in ACTIVE), unsafe_allow_html=True)
+    col_a, col_b, col_c = st.columns([1, 2, 1])
+    with col_b:
+        # Téléchargement désactivé tant que la fiche n'est pas complète
+        st.download_button(
+            label="⏳ Fiche en cours de rédaction…",
+            data=b"",
+            disabled=True,
+            use_container_width=True
+        )
 
 
 # --- 3. INTERFACE ---
@@ -420,129 +654,213 @@ st.markdown("""
 </section>
 """, unsafe_allow_html=True)
 
-# ── Section 01 — Niveau ──
-st.markdown("""
+# ── Espace de travail ──
+# Fragment : un clic sur le niveau, un dépôt de fichier ou le bouton ne
+# réexécutent que cette partie ; le style, le bandeau et la présentation
+# ne sont ni recalculés ni renvoyés au navigateur.
+@st.fragment
+def workspace():
+    # ── Section 01 — Niveau ──
+    st.markdown("""
 <div class="section-encart">
   <h2><span class="num-badge" aria-label="Étape 1">1</span>Choisir le niveau de classe</h2>
 """, unsafe_allow_html=True)
 
-cycle = st.radio(
-    "Niveau de classe :",
-    ["Cycle 2 (CP – CE1 – CE2)", "Cycle 3 (CM1 – CM2 – 6ᵉ)"],
-    horizontal=True,
-    label_visibility="collapsed"
-)
-cycle_short = "Cycle 2" if "2" in cycle else "Cycle 3"
+    cycle = st.radio(
+        "Niveau de classe :",
+        ["Cycle 2 (CP – CE1 – CE2)", "Cycle 3 (CM1 – CM2 – 6ᵉ)", "Cycles 2 et 3 (classe multiniveau)"],
+        horizontal=True,
+        label_visibility="collapsed"
+    )
+    # Classe multiniveau : les deux fiches, générées en même temps
+    cycles = CYCLES if cycle.startswith("Cycles") else (cycle[:len("Cycle 2")],)
 
-st.markdown("</div>", unsafe_allow_html=True)
+    st.markdown("</div>", unsafe_allow_html=True)
 
-# ── Section 02 — Upload ──
-st.markdown("""
+    # ── Section 02 — Upload ──
+    st.markdown("""
 <div class="section-encart">
   <h2><span class="num-badge" aria-label="Étape 2">2</span>Déposer le texte support</h2>
 """, unsafe_allow_html=True)
 
-uploaded_file = st.file_uploader(
-    "Formats acceptés : Word (.docx), PDF, image ou scan (JPG, PNG)",
-    type=['docx', 'pdf', 'jpg', 'jpeg', 'png'],
-    help="Le fichier peut être un texte tapé, un scan ou une photo. L'IA gère les deux."
-)
-
-st.markdown("</div>", unsafe_allow_html=True)
-
-# ── Bouton de génération ──
-col1, col2, col3 = st.columns([1, 2, 1])
-with col2:
-    generate = st.button(
-        "▶ Générer la fiche ADC",
-        use_container_width=True,
-        help="Cliquez après avoir sélectionné le niveau et déposé le fichier"
+    uploaded_file = st.file_uploader(
+        "Formats acceptés : Word (.docx), PDF, image ou scan (JPG, PNG)",
+        type=['docx', 'pdf', 'jpg', 'jpeg', 'png'],
+        # Refusé dès le navigateur : le fichier n'atteint ni la session ni la base
+        max_upload_size=MAX_UPLOAD_MB or None,
+        help="Le fichier peut être un texte tapé, un scan ou une photo. L'IA gère les deux."
     )
 
-# ── Logique de génération ──
-if uploaded_file and generate:
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # ── Bouton de génération ──
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        generate = st.button(
+            "▶ Générer la fiche ADC",
+            use_container_width=True,
+            help="Cliquez après avoir sélectionné le niveau et déposé le fichier"
+        )
+
+    # ── Résultats conservés entre les reruns ──
+    # Streamlit réexécute tout le script à chaque interaction (téléchargement,
+    # changement de niveau…) : la fiche et son .docx restent en session et le
+    # modèle n'est rappelé que si le fichier ou le niveau changent.
+    fiches = st.session_state.setdefault("fiches", {})
+    file_bytes = uploaded_file.getvalue() if uploaded_file else None
+    fingerprints = {c: input_fingerprint(file_bytes, c) for c in cycles} if uploaded_file else {}
+    missing = [c for c, fingerprint in fingerprints.items() if fingerprint not in fiches]
+
+    if generate and not uploaded_file:
+        st.warning("⚠️ Aucun fichier déposé — Veuillez d'abord sélectionner un texte support (étape 2).")
+
+    # ── Logique de génération ──
+    # La génération tourne en tâche de fond : son identifiant est gardé en session
+    # et dans l'adresse (?job=…), si bien qu'un rechargement de l'onglet retrouve
+    # la fiche en cours ou terminée. Plusieurs niveaux forment un groupe de
+    # tâches, suivi par l'identifiant de la première.
     api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        # Erreur : icône + texte, pas seulement la couleur
-        st.error("⚠️ Erreur de configuration — La clé API GEMINI_API_KEY est manquante dans les secrets de l'application.")
-        st.stop()
-
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.5-flash')
-
-    with st.spinner("Analyse pédagogique en cours…"):
-        try:
-            prompt_parts = [
-                f"""Agis en tant qu'expert pédagogique spécialisé en enseignement de la compréhension de texte.
-Rédige une fiche enseignant SYNTHÉTIQUE (2 pages maximum) pour un Atelier de Compréhension (ADC) pour le {cycle_short}.
-
-Structure obligatoire :
-1. TITRE & INFORMATIONS — niveau, durée estimée, organisation de classe
-2. OBJECTIFS DE COMPRÉHENSION — identifie 3 à 5 obstacles SPÉCIFIQUES au texte fourni (lexique opaque, chaînes anaphoriques, implicite culturel ou énonciatif, inférences nécessaires)
-3. DÉROULÉ EN 4 PHASES :
-   - Phase 1 : Lecture individuelle silencieuse
-   - Phase 2 : Tableau collaboratif avec exactement ces colonnes : "Ce qu'on sait" | "Ce qu'on ne sait pas" | "On n'est pas d'accord" — pré-rempli avec 3-4 exemples tirés du texte
-   - Phase 3 : Mise en commun et résolution collective
-   - Phase 4 : Retour sur les stratégies de compréhension mobilisées
-4. QUESTIONS-CLÉS — 5 questions de compréhension fine à poser à la classe, du littéral à l'inférentiel
-5. POINTS DE VIGILANCE — erreurs fréquentes à anticiper pour ce texte précis
-
-Sois précis, pratico-pratique. Évite les généralités. Tout doit être ancré dans le texte fourni.
-"""
-            ]
-
-            file_bytes = uploaded_file.read()
-            uploaded_file.seek(0)
-
-            if uploaded_file.type == "application/pdf":
-                pdf_doc = fitz.open(stream=file_bytes, filetype="pdf")
-                text_content = "".join([page.get_text() for page in pdf_doc])
-                if len(text_content.strip()) < 20:
-                    for i in range(len(pdf_doc)):
-                        page = pdf_doc.load_page(i)
-                        pix = page.get_pixmap()
-                        prompt_parts.append({"mime_type": "image/png", "data": pix.tobytes("png")})
+    model_ready = bool(api_key) or MODEL_BACKEND != "gemini"
+    job_id = st.session_state.get("job_id") or st.query_params.get("job")
+    jobs = get_job_runner(api_key).store.get_group(job_id) if model_ready and job_id else []
+
+    if uploaded_file and generate and missing:
+        if not model_ready:
+            # Erreur : icône + texte, pas seulement la couleur
+            st.error("⚠️ Erreur de configuration — La clé API GEMINI_API_KEY est manquante dans les secrets de l'application.")
+            st.stop()
+        # Un second clic pendant la génération ne relance pas le modèle
+        running = {job["fingerprint"] for job in jobs if job["status"] in ACTIVE}
+        if not running.issuperset(fingerprints[c] for c in missing):
+            runner = get_job_runner(api_key)
+            try:
+                check_upload(runner.store, uploaded_file.size)
+                if len(missing) == 1:
+                    job_id = runner.submit(missing[0], uploaded_file.type, fingerprints[missing[0]], file_bytes)
                 else:
-                    prompt_parts.append(f"Voici le texte support à analyser :\n\n{text_content}")
-            elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-                doc_in = Document(io.BytesIO(file_bytes))
-                text_content = "\n".join([p.text for p in doc_in.paragraphs if p.text.strip()])
-                prompt_parts.append(f"Voici le texte support à analyser :\n\n{text_content}")
+                    # Une seule extraction, les niveaux générés en parallèle
+                    job_id = runner.submit_group(missing, uploaded_file.type, [fingerprints[c] for c in missing],
+                                                 file_bytes)
+            except BudgetExceeded as e:
+                st.session_state["too_large"] = str(e)
+            except QueueFull as e:
+                # Trop de tâches en attente : rien n'est déposé
+                st.session_state["queue_full"] = str(e)
             else:
-                prompt_parts.append({"mime_type": uploaded_file.type, "data": file_bytes})
-
-            response = model.generate_content(prompt_parts)
-
-            # Résultat — h3 titre de zone
-            st.markdown('<h3 style="font-family:\'Fraunces\',Georgia,serif; color:#1B2A4A; font-size:1.1rem; margin:1.5rem 0 0.5rem;">📄 Fiche générée</h3>', unsafe_allow_html=True)
-            st.markdown(
-                f'<div class="output-zone" role="region" aria-label="Fiche ADC générée">'
-                f'{response.text.replace(chr(10), "<br>")}'
-                f'</div>',
-                unsafe_allow_html=True
+                remember_upload(job_id, uploaded_file.size)
+                jobs = runner.store.get_group(job_id)
+        if job_id:
+            st.session_state["job_id"] = job_id
+            st.query_params["job"] = job_id
+    if "too_large" in st.session_state:
+        st.error(f"⚠️ Document trop volumineux — {st.session_state.pop('too_large')}")
+    if "queue_full" in st.session_state:
+        st.warning(f"⚠️ Génération impossible pour l'instant — {st.session_state.pop('queue_full')}")
+
+    for job in jobs:
+        if job["status"] == "done" and fiches.get(job["fingerprint"], {}).get("job") != job["id"]:
+            docx_bytes = get_job_runner(api_key).store.get_docx(job["id"])
+            remember_fiche(fiches, job["fingerprint"], job["text"], docx_bytes, job["cycle"], job["id"])
+    job = next((job for job in jobs if job["status"] == "error"), None)
+    if job:
+        if job["error_kind"] == "budget":
+            st.error(f"⚠️ Document trop volumineux — {job['error']}")
+        elif job["error_kind"] == "queue_full":
+            st.warning(f"⚠️ Génération impossible pour l'instant — {job['error']}")
+        elif job["error_kind"] == "transient":
+            st.error("⚠️ Le service Gemini est momentanément saturé — Réessayez dans une minute.")
+        else:
+            st.error(f"⚠️ Erreur lors de la génération — {job['error']}")
+        st.session_state.pop("job_id", None)
+        st.query_params.pop("job", None)
+        jobs = []
+
+    # Fiches du fichier et du niveau choisis ; à défaut, les dernières affichées
+    shown = [fiches[fingerprint] for fingerprint in fingerprints.values() if fingerprint in fiches]
+    if not shown:
+        shown = [fiches[job["fingerprint"]] for job in jobs if job["fingerprint"] in fiches]
+    if not shown and st.session_state.get("fiche_last") in fiches:
+        shown = [fiches[st.session_state["fiche_last"]]]
+
+    if any(job["status"] in ACTIVE for job in jobs):
+        # Résultat — h3 titre de zone
+        st.markdown(RESULTS_TITLE if len(jobs) > 1 else RESULT_TITLE, unsafe_allow_html=True)
+        show_job_progress(job_id)
+    elif len(shown) > 1:
+        st.markdown(RESULTS_TITLE, unsafe_allow_html=True)
+        for tab, fiche in zip(st.tabs([fiche["cycle"] for fiche in shown]), shown):
+            with tab:
+                st.markdown(fiche_html(fiche["text"], label=f"Fiche ADC générée — {fiche['cycle']}"),
+                            unsafe_allow_html=True)
+                download_fiche(fiche, f"↓ Télécharger la fiche {fiche['cycle']} (Word .docx)")
+        col_a, col_b, col_c = st.columns([1, 2, 1])
+        with col_b:
+            st.download_button(
+                label="↓ Télécharger les deux fiches (.zip)",
+                data=fiches_zip(shown),
+                file_name="Fiches_ADC_Cycles_2_et_3.zip",
+                mime="application/zip",
+                on_click="ignore",
+                use_container_width=True
             )
-
-            docx_output = create_adc_docx_final(response.text, cycle_short)
-            col_a, col_b, col_c = st.columns([1, 2, 1])
-            with col_b:
-                st.download_button(
-                    label="↓ Télécharger la fiche (Word .docx)",
-                    data=docx_output,
-                    file_name=f"Fiche_ADC_{cycle_short.replace(' ', '_')}.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    use_container_width=True
-                )
-
-        except Exception as e:
-            st.error(f"⚠️ Erreur lors de la génération — {e}")
-
-elif generate and not uploaded_file:
-    st.warning("⚠️ Aucun fichier déposé — Veuillez d'abord sélectionner un texte support (étape 2).")
+        st.caption("Pour régénérer une section, choisissez un seul niveau : sa fiche s'affiche aussitôt.")
+    elif shown:
+        fiche = shown[0]
+        st.markdown(RESULT_TITLE, unsafe_allow_html=True)
+        st.markdown(fiche_html(fiche["text"]), unsafe_allow_html=True)
+        col_a, col_b, col_c = st.columns([1, 2, 1])
+        with col_b:
+            download_fiche(fiche)
+
+        # ── Régénérer une section ──
+        # Seule la section choisie est réécrite, à partir du texte support et des
+        # autres sections : bien plus court et plus rapide qu'une fiche complète.
+        keys = [key for key, _ in split_sections(fiche["text"]) if key in SECTION_TITLES]
+        if keys and uploaded_file and fiche["fingerprint"] in fingerprints.values() and model_ready:
+            col_s, col_r = st.columns([3, 2], vertical_alignment="bottom")
+            with col_s:
+                st.selectbox("Section à régénérer :", keys, format_func=SECTION_TITLES.get, key="section_key")
+            with col_r:
+                st.button("↻ Régénérer cette section", use_container_width=True, on_click=submit_section,
+                          args=(api_key, fiche["cycle"], uploaded_file, fiche["fingerprint"], fiche["text"]))
+
+    # ── Mesures (débogage) ──
+    if DEBUG_PANEL or st.query_params.get("debug") == "1":
+        with st.expander("Mesures des dernières générations"):
+            st.table([
+                {
+                    "statut": t["status"],
+                    "niveau": t["labels"].get("cycle", ""),
+                    "tâche": t["labels"].get("kind", "fiche"),
+                    "route": t["values"].get("route", ""),
+                    "type": t["labels"].get("mime_type", "").split("/")[-1][:12],
+                    "total (s)": t["total"],
+                    **{f"{stage} (s)": t["stages"].get(stage, 0.0) for stage in STAGES},
+                    "1er token (s)": t["stages"].get("first_token", 0.0),
+                    "Ko envoyés": round(t["values"].get("payload_bytes", 0) / 1024, 1),
+                    "tokens entrée": t["values"].get("input_tokens", t["values"].get("estimated_input_tokens", 0)),
+                    "tokens sortie": t["values"].get("output_tokens", 0),
+                    "cache": "oui" if t["values"].get("cache_hit") else "non",
+                    "doublés": t["values"].get("hedges", 0),
+                    "réparées": t["values"].get("repairs", 0),
+                }
+                for t in get_metrics().recent(10)
+            ])
+            st.caption(f"Traces : {get_metrics().traces_path} · Métriques : {get_metrics().metrics_path}")
+
+
+workspace()
 
 # ── Footer ──
-st.markdown("""
+st.markdown(f"""
 <footer class="footer-note" role="contentinfo">
   Inspiré de l'outil ACT · ROLL-Descartes · roll-descartes.fr<br>
-  Modèle IA : Gemini 2.5 Flash · Interface conçue pour les enseignants du primaire
+  Modèle IA : {" / ".join(name.replace("-", " ").title() for name in MODEL_NAMES)} · Interface conçue pour les enseignants du primaire
 </footer>
 """, unsafe_allow_html=True)
+
+# ── Préchargement ──
+# Une fois par processus, après le premier affichage : PyMuPDF, python-docx,
+# Pillow et le client Gemini se chargent en tâche de fond pendant que
+# l'enseignant choisit son texte.
+warm_up_once()
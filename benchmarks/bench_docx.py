@@ -0,0 +1,126 @@
+"""Débit et taille du rendu Word selon le nombre de lignes du tableau de Phase 2.
+
+Compare le compilateur actuel (adc.rendering) à l'ancien rendu ligne à
+ligne, qui créait un tableau par ligne et reconfigurait un Document vierge.
+
+    python benchmarks/bench_docx.py [--rounds 30]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document  # noqa: E402
+from docx.enum.text import WD_ALIGN_PARAGRAPH  # noqa: E402
+from docx.shared import Pt, Cm  # noqa: E402
+
+from adc.rendering import create_adc_docx_final  # noqa: E402
+
+
+def legacy_create_adc_docx(text_content, cycle_name):
+    doc = Document()
+    for section in doc.sections:
+        section.top_margin, section.bottom_margin = Cm(1.2), Cm(1.2)
+        section.left_margin, section.right_margin = Cm(1.5), Cm(1.5)
+
+    doc.styles['Normal'].font.name = 'Calibri'
+    doc.styles['Normal'].font.size = Pt(11)
+    title = doc.add_heading(f"FICHE ENSEIGNANT : ATELIER DE COMPRÉHENSION — {cycle_name}", 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    for line in text_content.split('\n'):
+        clean_line = line.strip()
+        if not clean_line:
+            continue
+        if clean_line.startswith(('#', '1.', '2.', '3.', '4.', '5.')) or "PHASE" in clean_line.upper():
+            doc.add_heading(clean_line.replace('#', '').strip(), level=1)
+        elif "|" in clean_line and "---" not in clean_line:
+            parts = [p.strip() for p in clean_line.split("|") if p.strip()]
+            if len(parts) >= 2:
+                table = doc.add_table(rows=1, cols=len(parts))
+                table.style = 'Table Grid'
+                for i, part in enumerate(parts):
+                    table.rows[0].cells[i].text = part
+        elif '**' in clean_line:
+            p = doc.add_paragraph()
+            for i, part in enumerate(clean_line.split('**')):
+                run = p.add_run(part)
+                if i % 2 != 0:
+                    run.bold = True
+        elif clean_line.startswith(('-', '*', '•')):
+            doc.add_paragraph(clean_line.strip('-*• ').strip(), style='List Bullet')
+        else:
+            doc.add_paragraph(clean_line)
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def sample_fiche(table_rows):
+    rows = "\n".join(
+        f"| Le loup **ment** (l. {i}) | Pourquoi la mère-grand ouvre-t-elle ? | Le chasseur arrive-t-il à temps ? |"
+        for i in range(table_rows)
+    )
+    return f"""## 1. TITRE & INFORMATIONS
+**Niveau :** Cycle 3 — **Durée :** 45 min — **Organisation :** groupes de 4
+
+## 2. OBJECTIFS DE COMPRÉHENSION
+- Identifier la chaîne anaphorique « il / le loup / la bête »
+- Inférer les intentions du loup à partir de ses *questions*
+- Comprendre l'implicite de la mise en garde finale
+
+## 3. DÉROULÉ EN 4 PHASES
+### Phase 1 : Lecture individuelle silencieuse
+Chaque élève lit le texte et surligne les passages difficiles.
+### Phase 2 : Tableau collaboratif
+| Ce qu'on sait | Ce qu'on ne sait pas | On n'est pas d'accord |
+|---|---|---|
+{rows}
+### Phase 3 : Mise en commun et résolution collective
+Confrontation des tableaux, retour au texte pour trancher.
+### Phase 4 : Retour sur les stratégies
+Qu'avons-nous fait pour comprendre ?
+
+## 4. QUESTIONS-CLÉS
+1. Où va le Petit Chaperon rouge ?
+2. Qui rencontre-t-elle dans le bois ?
+3. Pourquoi le loup lui demande-t-il où habite sa grand-mère ?
+4. Que pense le loup quand il voit les fleurs ?
+5. Quelle leçon l'auteur veut-il transmettre ?
+
+## 5. POINTS DE VIGILANCE
+- Confusion entre « elle » (la fillette) et « elle » (la grand-mère)
+"""
+
+
+def measure(render, text, rounds):
+    render(text, "Cycle 3")  # échauffement : imports, gabarit
+    start = time.perf_counter()
+    for _ in range(rounds):
+        output = render(text, "Cycle 3")
+    elapsed = time.perf_counter() - start
+    return rounds / elapsed, len(output.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--rows", type=int, nargs="+", default=[4, 20, 100])
+    args = parser.parse_args()
+
+    print(f"{'lignes':>7} {'rendu':<8} {'fiches/s':>9} {'octets':>8} {'tableaux':>9}")
+    for rows in args.rows:
+        text = sample_fiche(rows)
+        for name, render in (("ancien", legacy_create_adc_docx), ("actuel", create_adc_docx_final)):
+            per_second, size = measure(render, text, args.rounds)
+            tables = len(Document(render(text, "Cycle 3")).tables)
+            print(f"{rows:>7} {name:<8} {per_second:>9.1f} {size:>8} {tables:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Queue de latence avec et sans requête de couverture, avec le modèle factice.
+
+Le modèle factice répond en `--latency` secondes, mais une part `--slow-rate`
+des appels est `--slow-factor` fois plus lente. Chaque politique traite les
+mêmes appels (plusieurs à la fois) : p50, p95, p99 et appels supplémentaires.
+
+    python benchmarks/bench_hedging.py [--calls 400] [--slow-rate 0.05]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adc.models import MockModel  # noqa: E402
+from adc.policy import HedgedModel, RequestPolicy  # noqa: E402
+
+PROMPT = ["Rédige une fiche pour le Cycle 2.", "Le loup marchait dans la forêt."]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+class Counting:
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+
+    def generate_content(self, prompt_parts, **kwargs):
+        self.calls += 1
+        return self.model.generate_content(prompt_parts, **kwargs)
+
+
+def run(calls, concurrency, model, stream):
+    def one(_):
+        started = time.perf_counter()
+        response = model.generate_content(PROMPT, stream=stream)
+        if stream:
+            next(iter(response))  # premier morceau : ce que voit l'enseignant
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2, help="latence normale du modèle factice (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="part des appels lents")
+    parser.add_argument("--slow-factor", type=float, default=8.0, help="facteur de lenteur")
+    parser.add_argument("--budget", type=float, default=0.1, help="part maximale d'appels doublés")
+    parser.add_argument("--stream", action="store_true", help="course sur le premier morceau")
+    args = parser.parse_args()
+
+    print(f"{'politique':<12} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'max s':>7} {'appels en +':>12}")
+    for label in ("directe", "couverture"):
+        random.seed(0)
+        model = Counting(MockModel(latency=args.latency, slow_rate=args.slow_rate, slow_factor=args.slow_factor))
+        wrapped = model
+        if label == "couverture":
+            wrapped = HedgedModel(model, RequestPolicy(hedge_budget=args.budget))
+            run(40, args.concurrency, wrapped, args.stream)  # apprentissage du p95
+            model.calls = 0
+        latencies = run(args.calls, args.concurrency, wrapped, args.stream)
+        time.sleep(args.latency * args.slow_factor)  # les perdants abandonnés se terminent
+        print(f"{label:<12} {percentile(latencies, 50):>7.2f} {percentile(latencies, 95):>7.2f} "
+              f"{percentile(latencies, 99):>7.2f} {max(latencies):>7.2f} "
+              f"{100 * (model.calls - args.calls) / args.calls:>11.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Test de charge : des enseignants simulés utilisent l'application en même temps.
+
+Chaque utilisateur virtuel suit le parcours réel de app.py, sans navigateur
+(streamlit.testing.v1.AppTest). Il dépose un fichier du corpus, choisit le
+niveau, clique sur « Générer », attend la fiche puis lit le .docx
+téléchargeable, avec un temps de réflexion entre deux gestes. Le modèle est
+le modèle factice (ADC_MODEL_BACKEND=stub), dont la latence suit une loi
+log-normale avec des appels lents. Le reste est celui de la production et
+tourne dans ce processus, comme dans un worker : tâches de fond,
+ordonnanceur, extraction, cache et .docx.
+
+Pour chaque nombre d'utilisateurs simultanés, le script mesure :
+- les sessions terminées par seconde ;
+- la durée entre le clic et la fiche (p50, p95) ;
+- l'attente en file (étape "queue" des traces) ;
+- la mémoire par session ;
+- le taux d'erreur.
+
+La limite d'un worker est atteinte quand le débit cesse de croître alors
+que l'attente augmente.
+
+    python benchmarks/bench_load.py [--users 1,4,8,16] [--duration 60] [--think 2]
+
+Pour comparer des réglages de déploiement, les passer en variables
+d'environnement, par exemple `--env ADC_JOB_WORKERS=2 --env ADC_MAX_CONCURRENT=4`.
+
+AppTest ne gère pas plusieurs sessions à la fois dans un même processus.
+Les exécutions du script sont donc sérialisées ; dans un vrai worker, le
+GIL les sérialise déjà en grande partie. Les générations tournent en
+parallèle. Une session attend sa fiche par réexécutions complètes, toutes
+les `--poll` secondes, là où le navigateur ne réexécute que le fragment de
+suivi.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import streamlit as st  # noqa: E402
+from docx import Document  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from corpus import docx, photo, scanned_pdf, text_pdf  # noqa: E402
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+# Fichiers représentatifs : (nom, type MIME, fabrique(seed))
+FILES = (
+    ("texte.pdf", "application/pdf", lambda seed: text_pdf(2, seed=seed)),
+    ("scan.pdf", "application/pdf", lambda seed: scanned_pdf(2, seed=seed)),
+    ("texte.docx", DOCX_MIME, lambda seed: docx(20, seed=seed)),
+    ("photo.jpg", "image/jpeg", lambda seed: photo((1600, 1200), seed=seed)),
+)
+SINGLE_CYCLES = ("Cycle 2 (CP – CE1 – CE2)", "Cycle 3 (CM1 – CM2 – 6ᵉ)")
+MULTI_CYCLES = "Cycles 2 et 3 (classe multiniveau)"
+
+# Une seule exécution du script à la fois (voir plus haut)
+SCRIPT_LOCK = threading.Lock()
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def rss_bytes():
+    """Mémoire résidente du processus (Linux), à défaut son maximum."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemorySampler:
+    """Relève la mémoire résidente en tâche de fond ; `peak` : le maximum observé."""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True, name="bench-memory")
+        self._thread.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+
+def run(at):
+    with SCRIPT_LOCK:
+        at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+
+def download_labels(at):
+    return [button.proto.label for button in at.get("download_button") if not button.proto.disabled]
+
+
+def session(rng, args, seed):
+    """Un parcours complet ; renvoie la durée clic → fiche (s). Lève une exception en cas d'échec."""
+    name, mime_type, make = rng.choice(FILES)
+    # Une part des enseignants dépose un texte déjà traité (même contenu) : le cache répond
+    content = make(0 if rng.random() < args.repeat else seed)
+    multi = rng.random() < args.multi
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=args.timeout)
+    run(at)
+    time.sleep(rng.expovariate(1 / args.think) if args.think else 0)
+    at.radio[0].set_value(MULTI_CYCLES if multi else rng.choice(SINGLE_CYCLES))
+    at.file_uploader[0].set_value((name, content, mime_type))
+    run(at)
+    time.sleep(rng.expovariate(1 / args.think) if args.think else 0)
+    clicked = time.perf_counter()
+    at.button[0].click()
+    run(at)
+    expected = "↓ Télécharger les deux" if multi else "↓ Télécharger la fiche"
+    while not any(label.startswith(expected) for label in download_labels(at)):
+        if at.error or at.warning:
+            raise RuntimeError((at.error or at.warning)[0].value)
+        if time.perf_counter() - clicked > args.timeout:
+            raise TimeoutError(f"pas de fiche en {args.timeout:g} s")
+        time.sleep(args.poll)
+        run(at)
+    elapsed = time.perf_counter() - clicked
+    # Le bouton sert les octets gardés en session : les relire comme un .docx
+    fiches = list(at.session_state["fiches"].values())
+    for fiche in fiches[-(2 if multi else 1):]:
+        Document(io.BytesIO(fiche["docx"]))
+    return elapsed
+
+
+def fresh_state():
+    """Cache, ordonnanceur, tâches et mesures neufs ; renvoie leur répertoire."""
+    workdir = tempfile.mkdtemp(prefix="adc-load-")
+    os.environ.update(ADC_CACHE_DIR=os.path.join(workdir, "cache"), ADC_JOBS_DB=os.path.join(workdir, "jobs.db"),
+                      ADC_METRICS_DIR=os.path.join(workdir, "metrics"))
+    st.cache_resource.clear()
+    gc.collect()
+    return workdir
+
+
+def load_level(users, args):
+    """Fait tourner `users` utilisateurs pendant `args.duration` secondes."""
+    workdir = fresh_state()
+    baseline = rss_bytes()
+    sampler = MemorySampler()
+    durations, errors = [], []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + args.duration
+
+    def user(index):
+        rng = random.Random(f"{args.seed}-{users}-{index}")
+        # Arrivées étalées : pas de rafale au démarrage
+        time.sleep(rng.uniform(0, args.think or 0.5))
+        number = 0
+        while time.perf_counter() < deadline:
+            number += 1
+            try:
+                elapsed = session(rng, args, seed=hash((args.seed, users, index, number)) & 0xFFFF)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+            else:
+                with lock:
+                    durations.append(elapsed)
+            time.sleep(rng.expovariate(1 / args.think) if args.think else 0)
+
+    threads = [threading.Thread(target=user, args=(i,), name=f"bench-user-{i}") for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    peak = sampler.stop()
+
+    queue = []
+    traces_path = os.path.join(workdir, "metrics", "traces.jsonl")
+    if os.path.exists(traces_path):
+        with open(traces_path, encoding="utf-8") as f:
+            queue = [json.loads(line)["stages"].get("queue", 0.0) for line in f]
+    sessions = len(durations) + len(errors)
+    return {
+        "users": users,
+        "sessions": sessions,
+        "per_second": len(durations) / elapsed,
+        "p50": percentile(durations, 50),
+        "p95": percentile(durations, 95),
+        "queue_p50": percentile(queue, 50),
+        "queue_p95": percentile(queue, 95),
+        "memory_mb": max(0, peak - baseline) / users / 1024 / 1024,
+        "error_rate": len(errors) / sessions if sessions else 0.0,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", default="1,4,8,16", help="paliers d'utilisateurs simultanés")
+    parser.add_argument("--duration", type=float, default=60, help="durée de chaque palier (s)")
+    parser.add_argument("--think", type=float, default=2.0, help="temps de réflexion moyen entre deux gestes (s)")
+    parser.add_argument("--poll", type=float, default=1.0, help="intervalle de suivi de la génération (s)")
+    parser.add_argument("--timeout", type=float, default=180, help="attente maximale d'une fiche (s)")
+    parser.add_argument("--repeat", type=float, default=0.2, help="part des fichiers déjà traités")
+    parser.add_argument("--multi", type=float, default=0.1, help="part des classes multiniveaux")
+    parser.add_argument("--latency", type=float, default=3.0, help="latence médiane du modèle factice (s)")
+    parser.add_argument("--sigma", type=float, default=0.4, help="dispersion log-normale de la latence")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="part des appels lents")
+    parser.add_argument("--slow-factor", type=float, default=5.0, help="facteur de lenteur")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="délai entre deux morceaux du flux (s)")
+    parser.add_argument("--env", action="append", default=[], metavar="NOM=VALEUR",
+                        help="réglage de déploiement (variable ADC_…), répétable")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.pop("GEMINI_API_KEY", None)
+    os.environ.update(
+        ADC_MODEL_BACKEND="stub", ADC_STUB_LATENCY=str(args.latency), ADC_STUB_LATENCY_SIGMA=str(args.sigma),
+        ADC_STUB_SLOW_RATE=str(args.slow_rate), ADC_STUB_SLOW_FACTOR=str(args.slow_factor),
+        ADC_STUB_CHUNK_DELAY=str(args.chunk_delay),
+    )
+    os.environ.update(setting.split("=", 1) for setting in args.env)
+
+    # Échauffement : imports et gabarit Word chargés hors mesure
+    fresh_state()
+    session(random.Random(args.seed), argparse.Namespace(**{**vars(args), "think": 0, "repeat": 0, "multi": 0}),
+            seed=0)
+
+    print(f"{'utilisateurs':>12} {'sessions':>9} {'sessions/s':>11} {'p50 s':>7} {'p95 s':>7} "
+          f"{'file p50':>9} {'file p95':>9} {'Mo/session':>11} {'erreurs':>8}")
+    for users in (int(n) for n in args.users.split(",")):
+        result = load_level(users, args)
+        print(f"{result['users']:>12} {result['sessions']:>9} {result['per_second']:>11.2f} "
+              f"{result['p50']:>7.2f} {result['p95']:>7.2f} {result['queue_p50']:>9.2f} "
+              f"{result['queue_p95']:>9.2f} {result['memory_mb']:>11.1f} {100 * result['error_rate']:>7.1f}%")
+        for error in sorted(set(result["errors"]))[:3]:
+            print(f"{'':>12} {error}")
+
+
+if __name__ == "__main__":
+    main()
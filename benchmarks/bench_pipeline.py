@@ -0,0 +1,195 @@
+"""Performances du pipeline hors ligne, avec le modèle factice.
+
+Sur un corpus synthétique (PDF texte, PDF scannés, Word, photos) : débit,
+latence p50/p95 et pic mémoire de l'extraction, de l'assemblage du prompt
+et du rendu Word ; la reprise d'un même document pour l'autre niveau, avec
+et sans cache de contexte, à débit d'envoi simulé ; puis des générations de
+bout en bout (tâches de fond, ordonnanceur, cache) pour N sessions simultanées.
+
+    python benchmarks/bench_pipeline.py [--rounds 5] [--sessions 1 8 32]
+    python benchmarks/bench_pipeline.py --kinds photo --json resultats.json
+
+Le pic mémoire est celui des allocations Python (tracemalloc) : les tampons
+internes de PyMuPDF et Pillow n'y figurent pas, le RSS maximal du
+processus est donné à la fin.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adc.cache import FicheCache  # noqa: E402
+from adc.context import ContextCache  # noqa: E402
+from adc.extraction import IngestionBudget  # noqa: E402
+from adc.jobs import FicheJobHandler, JobRunner, JobStore  # noqa: E402
+from adc.metrics import TracedModel  # noqa: E402
+from adc.models import MockModel  # noqa: E402
+from adc.pipeline import fiche_request, generate_fiche, prepare_source  # noqa: E402
+from adc.rendering import create_adc_docx_final  # noqa: E402
+from adc.scheduler import ModelScheduler, ScheduledModel  # noqa: E402
+
+from corpus import FACTORIES, SIZES, build_corpus  # noqa: E402
+
+PDF_OPTIONS = {"dpi": 150, "grayscale": True, "image_format": "jpeg", "quality": 70}
+IMAGE_OPTIONS = {"max_edge": 1600, "grayscale": True, "image_format": "jpeg", "quality": 70}
+# Plafonds relevés : le benchmark mesure aussi les documents hors limites de l'interface
+NO_LIMITS = {"max_bytes": 0, "max_pages": 0, "max_tokens": 0}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def timed(call, rounds):
+    """[durées] de `rounds` appels, puis pic mémoire (Mo) d'un appel supplémentaire."""
+    call()  # échauffement : imports, pool de rendu, gabarit Word
+    durations = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        call()
+        durations.append(time.perf_counter() - started)
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return durations, peak
+
+
+def stage_row(name, stage, durations, peak):
+    return {
+        "document": name, "stage": stage,
+        "per_second": len(durations) / sum(durations),
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p95_ms": percentile(durations, 95) * 1000,
+        "peak_mb": peak,
+    }
+
+
+def bench_stages(corpus, rounds):
+    model = MockModel()
+    rows = []
+    for name, mime_type, data in corpus:
+        def extract():
+            return prepare_source(data, mime_type, budget=IngestionBudget(**NO_LIMITS),
+                                  image_options=IMAGE_OPTIONS, **PDF_OPTIONS)
+        source = extract()
+        rows.append(stage_row(name, "extraction", *timed(extract, rounds)))
+        rows.append(stage_row(name, "prompt", *timed(lambda: fiche_request(model, source, "Cycle 2"), rounds)))
+        text = model.generate_content(fiche_request(model, source, "Cycle 2")[0]).text
+        rows.append(stage_row(name, "docx", *timed(lambda: create_adc_docx_final(text, "Cycle 2"), rounds)))
+    return rows
+
+
+def bench_context(corpus, bandwidth):
+    """Cycle 2 puis Cycle 3 du même document : texte support renvoyé, ou référencé.
+
+    Délai du modèle nul : seul compte l'envoi du prompt au débit `bandwidth`.
+    """
+    rows = []
+    for name, mime_type, data in corpus:
+        row = {"document": name}
+        for label, ttl in (("inline", 0), ("context", 900)):
+            model = MockModel(bandwidth=bandwidth)
+            source = prepare_source(data, mime_type, budget=IngestionBudget(**NO_LIMITS),
+                                    image_options=IMAGE_OPTIONS, contexts=ContextCache(model, ttl) if ttl else None,
+                                    **PDF_OPTIONS)
+            for cycle_short in ("Cycle 2", "Cycle 3"):
+                started = time.perf_counter()
+                generate_fiche(model, source, cycle_short)
+                row[f"{label}_{cycle_short[-1]}_s"] = time.perf_counter() - started
+        rows.append(row)
+    return rows
+
+
+def bench_sessions(sessions, latency, chunk_delay, max_concurrent, kinds):
+    """N sessions déposent chacune un document différent en même temps."""
+    model = MockModel(latency=latency, chunk_delay=chunk_delay)
+    scheduler = ModelScheduler(requests_per_minute=0, tokens_per_minute=0,
+                               max_concurrent=max_concurrent, max_queue=0)
+    workdir = tempfile.mkdtemp(prefix="adc-bench-")
+    handler = FicheJobHandler(
+        lambda on_position, trace: ScheduledModel(TracedModel(model, trace), scheduler, on_position),
+        FicheCache(os.path.join(workdir, "cache")), "stub", NO_LIMITS, IMAGE_OPTIONS, PDF_OPTIONS,
+    )
+    store = JobStore(os.path.join(workdir, "jobs.sqlite3"))
+    runner = JobRunner(store, handler, workers=sessions)
+    # Tailles moyennes, un texte différent par session : pas de réponse en cache
+    documents = []
+    for i in range(sessions):
+        kind = kinds[i % len(kinds)]
+        factory, mime_type = FACTORIES[kind]
+        documents.append((mime_type, factory(SIZES[kind][1], seed=1000 + i)))
+
+    started = time.time()
+    job_ids = [runner.submit("Cycle 2", mime_type, None, data) for mime_type, data in documents]
+    while any(store.get(job_id)["status"] in ("queued", "running") for job_id in job_ids):
+        time.sleep(0.05)
+    wall = time.time() - started
+    jobs = [store.get(job_id) for job_id in job_ids]
+    latencies = [job["updated"] - job["created"] for job in jobs]
+    return {
+        "sessions": sessions,
+        "errors": sum(job["status"] != "done" for job in jobs),
+        "per_minute": 60 * sessions / wall,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "wall_s": wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--kinds", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--sessions", type=int, nargs="*", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=2.0, help="délai du modèle factice avant le premier morceau")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="délai entre deux morceaux")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="appels simultanés au modèle")
+    parser.add_argument("--bandwidth", type=float, default=2.0,
+                        help="débit d'envoi simulé pour la reprise d'un document (Mo/s, 0 pour sauter)")
+    parser.add_argument("--json", help="écrit aussi les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.kinds)
+    stages = bench_stages(corpus, args.rounds)
+    print(f"{'document':<22} {'étape':<11} {'docs/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'pic Mo':>8}")
+    for row in stages:
+        print(f"{row['document']:<22} {row['stage']:<11} {row['per_second']:>8.1f} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['peak_mb']:>8.1f}")
+
+    reuse = []
+    if args.bandwidth:
+        reuse = bench_context(corpus, args.bandwidth * 1024 * 1024)
+        print(f"\nReprise pour l'autre niveau — envoi à {args.bandwidth} Mo/s (secondes)")
+        print(f"{'document':<22} {'C2 sans':>8} {'C3 sans':>8} {'C2 avec':>8} {'C3 avec':>8}")
+        for row in reuse:
+            print(f"{row['document']:<22} {row['inline_2_s']:>8.2f} {row['inline_3_s']:>8.2f} "
+                  f"{row['context_2_s']:>8.2f} {row['context_3_s']:>8.2f}")
+
+    sessions = []
+    if args.sessions:
+        print(f"\nBout en bout — modèle factice : {args.latency} s + {args.chunk_delay} s/morceau, "
+              f"{args.max_concurrent} appels simultanés")
+        print(f"{'sessions':>8} {'fiches/min':>11} {'p50 s':>7} {'p95 s':>7} {'erreurs':>8}")
+        for count in args.sessions:
+            row = bench_sessions(count, args.latency, args.chunk_delay, args.max_concurrent, args.kinds)
+            sessions.append(row)
+            print(f"{row['sessions']:>8} {row['per_minute']:>11.1f} {row['p50_s']:>7.2f} "
+                  f"{row['p95_s']:>7.2f} {row['errors']:>8}")
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nRSS maximal du processus : {max_rss:.0f} Mo")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"stages": stages, "context": reuse, "sessions": sessions, "max_rss_mb": max_rss}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Démarrage à froid et coût d'un rerun de l'interface Streamlit.
+
+Lance `streamlit run app.py` puis s'y connecte comme le navigateur
+(websocket, messages protobuf, cache des gros messages) pour mesurer :
+- le démarrage à froid : lancement du serveur, puis premier affichage complet ;
+- un rerun : clic sur le niveau de classe, durée côté serveur et octets reçus.
+
+    python benchmarks/bench_startup.py [--app app.py] [--reruns 20]
+
+Pour comparer deux versions, lancer le script sur chacune (par exemple
+dans un `git worktree` de l'ancienne révision, avec `--app`).
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ClientState_pb2 import ClientState
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from websockets.asyncio.client import connect
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, port):
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    return subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.basename(app),
+         "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+        cwd=os.path.dirname(os.path.abspath(app)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_healthy(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as r:
+                if r.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("le serveur Streamlit n'a pas démarré")
+
+
+class Browser:
+    """Client minimal : envoie les reruns, reçoit les messages jusqu'à la fin du script."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.cached = set()
+        self.radio = None  # (identifiant du widget, options, fragment englobant)
+
+    async def run(self, widget_states=None, fragment_id=""):
+        state = ClientState(query_string="", page_script_hash="", fragment_id=fragment_id)
+        state.cached_message_hashes.extend(self.cached)
+        if widget_states is not None:
+            state.widget_states.CopyFrom(widget_states)
+        msg = BackMsg()
+        msg.rerun_script.CopyFrom(state)
+        started = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        received = deltas = 0
+        error = ""
+        while True:
+            data = await self.ws.recv()
+            received += len(data)
+            fmsg = ForwardMsg()
+            fmsg.ParseFromString(data)
+            kind = fmsg.WhichOneof("type")
+            if fmsg.metadata.cacheable:
+                self.cached.add(fmsg.hash)
+            if kind == "delta":
+                deltas += 1
+                element = fmsg.delta.new_element
+                if element.WhichOneof("type") == "exception":
+                    error = element.exception.message
+                if element.WhichOneof("type") == "radio" and self.radio is None:
+                    self.radio = (element.radio.id, list(element.radio.options), fmsg.delta.fragment_id)
+            elif kind == "script_finished":
+                return time.perf_counter() - started, received, deltas, error
+
+
+async def measure(app, reruns, settle):
+    port = free_port()
+    spawned = time.perf_counter()
+    server = start_server(app, port)
+    try:
+        wait_healthy(port)
+        healthy = time.perf_counter() - spawned
+        ws = await connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                           max_size=None)
+        browser = Browser(ws)
+        first, first_bytes, first_deltas, _ = await browser.run()
+        cold = time.perf_counter() - spawned
+        await asyncio.sleep(settle)  # préchargement éventuel en tâche de fond
+
+        radio_id, options, fragment_id = browser.radio
+        durations, sizes, counts = [], [], []
+        for i in range(reruns):
+            states = ClientState().widget_states
+            widget = states.widgets.add()
+            widget.id = radio_id
+            widget.string_value = options[(i + 1) % 2]
+            seconds, received, deltas, error = await browser.run(states, fragment_id)
+            if error:
+                raise RuntimeError(f"erreur dans le script : {error}")
+            durations.append(seconds)
+            sizes.append(received)
+            counts.append(deltas)
+        await ws.close()
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "server_s": healthy, "first_run_s": first, "cold_start_s": cold,
+        "first_kb": first_bytes / 1024, "first_deltas": first_deltas,
+        "rerun_ms_p50": statistics.median(durations) * 1000,
+        "rerun_ms_max": max(durations) * 1000,
+        "rerun_kb": statistics.median(sizes) / 1024,
+        "rerun_deltas": statistics.median(counts),
+        "fragment": bool(fragment_id),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"))
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--settle", type=float, default=3.0, help="pause avant les reruns (s)")
+    args = parser.parse_args()
+
+    r = asyncio.run(measure(args.app, args.reruns, args.settle))
+    print(f"Serveur prêt                 : {r['server_s']:.2f} s")
+    print(f"Premier affichage            : {r['first_run_s']:.2f} s "
+          f"({r['first_kb']:.1f} Ko, {r['first_deltas']} éléments)")
+    print(f"Démarrage à froid (total)    : {r['cold_start_s']:.2f} s")
+    print(f"Rerun (clic sur le niveau)   : p50 {r['rerun_ms_p50']:.1f} ms, max {r['rerun_ms_max']:.1f} ms, "
+          f"{r['rerun_kb']:.1f} Ko, {r['rerun_deltas']:.0f} éléments"
+          f"{' — fragment seul' if r['fragment'] else ' — page entière'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Corpus synthétique et déterministe pour les benchmarks.
+
+PDF texte, PDF scannés (pages en image, sans couche texte), documents Word
+et photos de téléphone (grand JPEG bruité, orientation EXIF), en plusieurs
+tailles. Un même `seed` redonne les mêmes octets.
+"""
+import io
+import random
+
+import pymupdf
+from docx import Document
+from PIL import Image, ImageDraw, ImageFilter
+
+WORDS = (
+    "le loup la forêt petite fille panier grand-mère chemin maison porte soir "
+    "marchait regardait pensait disait savait voulait sombre profonde lentement "
+    "pourquoi personne rien toujours village rivière arbre lumière peur silence "
+    "chaperon bûcheron galette beurre fleurs oiseaux vent nuit matin soleil"
+).split()
+
+# Tailles de chaque type : pages, paragraphes ou pixels
+SIZES = {
+    "text_pdf": (2, 10, 40),
+    "scanned_pdf": (1, 4, 12),
+    "docx": (20, 200, 1500),
+    "photo": ((1600, 1200), (3024, 4032), (4000, 6000)),
+}
+
+
+def paragraph(rng, words=60):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def text_pdf(pages, seed=0):
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 40), "Lectures du soir — recueil de contes", fontsize=9)
+        body = "\n\n".join(paragraph(rng) for _ in range(5))
+        page.insert_textbox(pymupdf.Rect(72, 72, 523, 760), body, fontsize=11)
+        page.insert_text((290, 810), str(number + 1), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def scanned_pdf(pages, seed=0, dpi=150):
+    # Chaque page texte est rendue puis réinsérée en image : plus de couche texte
+    source = pymupdf.open(stream=text_pdf(pages, seed), filetype="pdf")
+    doc = pymupdf.open()
+    for page in source:
+        pix = page.get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY)
+        target = doc.new_page(width=page.rect.width, height=page.rect.height)
+        target.insert_image(target.rect, stream=pix.tobytes("jpeg", jpg_quality=85))
+    data = doc.tobytes()
+    doc.close()
+    source.close()
+    return data
+
+
+def docx(paragraphs, seed=0):
+    rng = random.Random(seed)
+    doc = Document()
+    doc.add_heading("Le petit chaperon rouge", 1)
+    for _ in range(paragraphs):
+        doc.add_paragraph(paragraph(rng))
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def photo(size, seed=0):
+    """Photo d'une page de livre : fond inégal, léger flou, pivotée par l'EXIF."""
+    rng = random.Random(seed)
+    width, height = size
+    img = Image.new("RGB", (width, height), (214, 205, 188))
+    draw = ImageDraw.Draw(img)
+    margin = width // 10
+    draw.rectangle((margin, margin, width - margin, height - margin), fill=(246, 242, 232))
+    line_height = max(12, height // 60)
+    for y in range(margin * 2, height - margin * 2, line_height):
+        x = margin * 2
+        while x < width - margin * 2:
+            word = rng.randint(2, 9) * line_height // 3
+            draw.rectangle((x, y, min(x + word, width - margin * 2), y + line_height // 2), fill=(40, 36, 30))
+            x += word + line_height // 2
+    img = img.filter(ImageFilter.GaussianBlur(1))
+    noise = Image.frombytes("L", (width, height), rng.randbytes(width * height)).convert("RGB")
+    img = Image.blend(img, noise, 0.05)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # prise en portrait, à pivoter de 90°
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=90, exif=exif)
+    return buffer.getvalue()
+
+
+FACTORIES = {
+    "text_pdf": (text_pdf, "application/pdf"),
+    "scanned_pdf": (scanned_pdf, "application/pdf"),
+    "docx": (docx, "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    "photo": (photo, "image/jpeg"),
+}
+
+
+def build_corpus(kinds=tuple(SIZES), seed=0):
+    """[(nom, type MIME, octets)] : chaque type dans chacune de ses tailles."""
+    corpus = []
+    for kind in kinds:
+        factory, mime_type = FACTORIES[kind]
+        for size in SIZES[kind]:
+            label = "x".join(map(str, size)) if isinstance(size, tuple) else str(size)
+            corpus.append((f"{kind}-{label}", mime_type, factory(size, seed)))
+    return corpus
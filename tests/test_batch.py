@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from adc.batch import run_batch
+from adc.models import make_model
+
+
+def test_model_is_required(tmp_path):
+    with pytest.raises(TypeError):
+        run_batch(str(tmp_path), str(tmp_path / "fiches"))
+    with pytest.raises(TypeError, match="make_model"):
+        run_batch(str(tmp_path), str(tmp_path / "fiches"), None)
+
+
+def test_batch_with_the_stub_model(tmp_path):
+    from docx import Document
+
+    doc = Document()
+    doc.add_paragraph("Le loup marchait dans la forêt profonde. " * 20)
+    doc.save(tmp_path / "conte.docx")
+    results = run_batch(str(tmp_path), str(tmp_path / "fiches"), make_model("stub"), cycles=("Cycle 2",),
+                        log=lambda message: None, context_ttl=0)
+    assert [status for _, _, status in results] == ["générée"]
+    assert os.listdir(tmp_path / "fiches")
+
+
+def test_texts_with_the_same_name_get_their_own_fiches(tmp_path):
+    from docx import Document
+    from PIL import Image
+
+    doc = Document()
+    doc.add_paragraph("Le loup marchait dans la forêt profonde. " * 20)
+    doc.save(tmp_path / "conte.docx")
+    Image.new("RGB", (200, 100), "white").save(tmp_path / "conte.jpg")
+    results = run_batch(str(tmp_path), str(tmp_path / "fiches"), make_model("stub"), cycles=("Cycle 2",),
+                        log=lambda message: None, context_ttl=0)
+    assert [status for _, _, status in results] == ["générée", "générée"]
+    assert sorted(name for name in os.listdir(tmp_path / "fiches") if name.endswith(".docx")) == [
+        "Fiche_ADC_conte_docx_Cycle_2.docx", "Fiche_ADC_conte_jpg_Cycle_2.docx"]
@@ -0,0 +1,33 @@
+import pymupdf
+
+from adc import extraction
+
+
+def pdf(pages):
+    doc = pymupdf.open()
+    for number in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {number + 1}")
+    return doc.tobytes()
+
+
+def test_dead_raster_worker_does_not_break_later_extractions():
+    source = pdf(4)
+    assert len(extraction.rasterize_pages(source, [0, 1, 2, 3], dpi=30, workers=2)) == 4
+    for process in list(extraction._pool._processes.values()):
+        process.kill()
+        process.join()
+    assert len(extraction.rasterize_pages(source, [0, 1, 2, 3], dpi=30, workers=2)) == 4
+    assert len(extraction.rasterize_pages(source, [0, 1, 2, 3], dpi=30, workers=2)) == 4
+
+
+def test_docx_verse_keeps_its_line_breaks():
+    import io
+
+    from docx import Document
+
+    doc = Document()
+    doc.add_paragraph("Peindre d'abord une cage\navec une porte ouverte\npeindre ensuite")
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    (text,) = extraction.extract_source(buffer.getvalue(), extraction.DOCX_MIME)
+    assert "une cage\navec une porte ouverte\npeindre ensuite" in text
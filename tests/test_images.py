@@ -0,0 +1,25 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from adc.images import preprocess_image
+
+
+def transparent_text(mode):
+    img = Image.new("RGBA", (400, 200), (0, 0, 0, 0))
+    ImageDraw.Draw(img).text((40, 80), "Il était une fois", fill=(0, 0, 0, 255))
+    if mode == "P":
+        img = img.quantize()
+    elif mode != "RGBA":
+        img = img.convert(mode)
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_transparent_background_becomes_white():
+    for mode in ("RGBA", "LA", "P"):
+        data, _, _, _ = preprocess_image(transparent_text(mode))
+        img = Image.open(io.BytesIO(data))
+        low, high = img.getextrema()
+        assert high >= 250 and low < 100, mode
@@ -0,0 +1,48 @@
+import threading
+import time
+
+import pytest
+
+from adc.jobs import JobRunner, JobStore
+from adc.scheduler import QueueFull
+
+
+class BlockingHandler:
+    """Tâche qui ne se termine qu'une fois `release` levé."""
+
+    def __init__(self):
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def __call__(self, store, job_id):
+        self.started.release()
+        self.release.wait(5)
+        return {job["id"]: ("texte", b"docx") for job in store.get_group(job_id)}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_waiting_jobs_have_a_position_and_the_queue_is_bounded(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    handler = BlockingHandler()
+    runner = JobRunner(store, handler, workers=1, max_pending=2)
+    running = runner.submit("Cycle 2", "text/plain", "a", b"a")
+    assert handler.started.acquire(timeout=5)
+    first = runner.submit("Cycle 2", "text/plain", "b", b"b")
+    group = runner.submit_group(["Cycle 2", "Cycle 3"], "text/plain", ["c2", "c3"], b"c")
+    with pytest.raises(QueueFull):
+        runner.submit("Cycle 2", "text/plain", "d", b"d")
+
+    assert store.get(running)["position"] is None
+    assert store.get(first)["position"] == 1
+    assert [job["position"] for job in store.get_group(group)] == [2, 2]
+
+    handler.release.set()
+    wait_for(lambda: all(job["status"] == "done" for job in store.get_group(group)))
+    assert store.get(first)["position"] is None
+    assert runner.submit("Cycle 2", "text/plain", "d", b"d")
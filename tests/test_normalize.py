@@ -0,0 +1,25 @@
+from adc.normalize import normalize_text, strip_page_furniture
+
+
+def test_line_end_hyphen_is_joined():
+    assert normalize_text("la compré-\nhension du texte") == "la compréhension du texte"
+
+
+def test_compound_written_elsewhere_keeps_its_hyphen():
+    text = "Sa grand-mère dort.\nLa grand-\nmère se réveille."
+    assert normalize_text(text) == "Sa grand-mère dort.\nLa grand-mère se réveille."
+
+
+def test_capitalised_continuation_is_not_joined():
+    assert normalize_text("Marie-\nLouise arrive.") == "Marie-\nLouise arrive."
+
+
+def test_unwrapped_text_keeps_its_line_breaks():
+    verse = "Peindre d'abord une cage\navec une porte ouverte\npeindre ensuite"
+    assert normalize_text(verse, wrapped=False) == verse
+    assert normalize_text(verse) == "Peindre d'abord une cage avec une porte ouverte peindre ensuite"
+
+
+def test_page_numbers_are_only_removed_at_the_page_edges():
+    page = "12\nLa guerre éclate en\n1914\net dure quatre ans.\nFin du chapitre.\n13"
+    assert strip_page_furniture(page) == "La guerre éclate en\n1914\net dure quatre ans.\nFin du chapitre."
@@ -0,0 +1,53 @@
+from docx import Document
+
+from adc.models import MOCK_FICHE
+from adc.rendering import create_adc_docx_final
+
+FICHE = MOCK_FICHE.replace("{cycle}", "Cycle 2")
+PIPED_PHASE = ("**Phase 2 : Tableau collaboratif** — \"Ce qu'on sait\" | \"Ce qu'on ne sait pas\" | "
+               "\"On n'est pas d'accord\"")
+
+
+def render(text):
+    return Document(create_adc_docx_final(text, "Cycle 2"))
+
+
+def headings(doc, level):
+    return [p.text for p in doc.paragraphs if p.style.name == f"Heading {level}"]
+
+
+def test_mock_fiche_sections_phases_and_table():
+    doc = render(FICHE)
+    assert headings(doc, 1) == ["1. TITRE & INFORMATIONS", "2. OBJECTIFS DE COMPRÉHENSION",
+                                "3. DÉROULÉ EN 4 PHASES", "4. QUESTIONS-CLÉS", "5. POINTS DE VIGILANCE"]
+    assert len(headings(doc, 2)) == 4
+    (table,) = doc.tables
+    assert len(table.rows) == 4
+    assert [cell.text for cell in table.rows[0].cells] == ["Ce qu'on sait", "Ce qu'on ne sait pas",
+                                                          "On n'est pas d'accord"]
+
+
+def test_phase_title_with_column_names_stays_a_heading():
+    doc = render(FICHE.replace("### Phase 2 : Tableau collaboratif", PIPED_PHASE))
+    assert any(text.startswith("Phase 2 : Tableau collaboratif") for text in headings(doc, 2))
+    (table,) = doc.tables
+    assert len(table.rows) == 4
+    assert table.rows[0].cells[0].text == "Ce qu'on sait"
+
+
+def test_bold_numbered_questions_stay_paragraphs():
+    text = FICHE.replace("1. Qui sont", "**1. Qui sont").replace(
+        "l'histoire ?\n2.", "l'histoire ?**\n**2. (Littéral)**")
+    doc = render(text)
+    assert len(headings(doc, 1)) == 5
+    assert any(p.text.startswith("1. Qui sont") for p in doc.paragraphs if p.style.name == "Normal")
+
+
+def test_mixed_case_section_titles_and_rows_without_outer_pipes():
+    text = FICHE.replace("## 5. POINTS DE VIGILANCE", "**5. Points de vigilance**").replace(
+        "| Le personnage part de chez lui | Pourquoi il part | S'il a raison de partir |",
+        "Le personnage part de chez lui | Pourquoi il part | S'il a raison de partir")
+    doc = render(text)
+    assert headings(doc, 1)[-1] == "5. Points de vigilance"
+    (table,) = doc.tables
+    assert len(table.rows) == 4
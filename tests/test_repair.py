@@ -0,0 +1,53 @@
+from adc.models import MOCK_FICHE, MockModel
+from adc.pipeline import prepare_source, repair_fiche
+from adc.sections import SECTION_KEYS, split_sections
+from adc.validation import validate_fiche
+
+FICHE = MOCK_FICHE.replace("{cycle}", "Cycle 2")
+SOURCE = prepare_source(("Il était une fois un renard. " * 20).encode(), "text/plain")
+
+
+def test_valid_fiche_is_not_sent_back():
+    model = MockModel()
+    assert repair_fiche(model, SOURCE, "Cycle 2", FICHE) == FICHE
+    assert model.calls == 0
+
+
+def test_faulty_sections_are_repaired_in_one_call():
+    text = FICHE.replace("5. Que pense l'auteur de ce qui arrive ?\n", "").split("## 5.")[0]
+    model = MockModel()
+    repaired = repair_fiche(model, SOURCE, "Cycle 2", text)
+    assert model.calls == 1
+    assert validate_fiche(repaired) == {}
+    assert [key for key, _ in split_sections(repaired)] == list(SECTION_KEYS)
+
+
+def test_title_with_text_name_is_not_duplicated():
+    text = FICHE.replace("## 1. TITRE & INFORMATIONS", "## 1. TITRE & INFORMATIONS : « Le Petit Chaperon rouge »")
+    model = MockModel()
+    assert repair_fiche(model, SOURCE, "Cycle 2", text) == text
+    assert model.calls == 0
+
+
+def test_mixed_case_fiche_is_not_duplicated():
+    text = FICHE
+    for title in ("TITRE & INFORMATIONS", "OBJECTIFS DE COMPRÉHENSION", "DÉROULÉ EN 4 PHASES", "QUESTIONS-CLÉS",
+                  "POINTS DE VIGILANCE"):
+        text = text.replace(title, title.capitalize())
+    assert repair_fiche(MockModel(), SOURCE, "Cycle 2", text) == text
+
+
+def test_missing_section_is_not_added_after_unparsed_text():
+    text = "Voici la fiche :\n\n" + FICHE.split("## 5.")[0]
+    model = MockModel()
+    assert repair_fiche(model, SOURCE, "Cycle 2", text) == text
+    assert model.calls == 0
+
+
+def test_failed_repair_call_keeps_the_fiche():
+    class Failing(MockModel):
+        def generate_content(self, prompt_parts, stream=False, **kwargs):
+            raise RuntimeError("indisponible")
+
+    text = FICHE.split("## 5.")[0]
+    assert repair_fiche(Failing(), SOURCE, "Cycle 2", text) == text
@@ -0,0 +1,140 @@
+import threading
+import time
+
+import pytest
+
+from adc.models import MockModel
+from adc.pipeline import consume_lines
+from adc.scheduler import ModelScheduler, QueueFull, ScheduledModel
+
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+
+class FailingMidStream(MockModel):
+    """Premier flux interrompu par une erreur 503 après un morceau."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.failures = 1
+
+    def generate_content(self, prompt_parts, stream=False, **kwargs):
+        response = super().generate_content(prompt_parts, stream=stream, **kwargs)
+        if not stream or not self.failures:
+            return response
+        self.failures -= 1
+
+        def chunks():
+            yield next(iter(response))
+            raise ServiceUnavailable("service indisponible")
+        return chunks()
+
+
+def scheduler(**limits):
+    return ModelScheduler(**{"requests_per_minute": 0, "tokens_per_minute": 0, "base_delay": 0.01, **limits})
+
+
+def test_stream_keeps_its_slot_until_exhausted():
+    model = ScheduledModel(MockModel(chunk_delay=0.01), scheduler(max_concurrent=1))
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def one():
+        for _ in model.generate_content(["Cycle 2"], stream=True):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.001)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=one) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 1
+
+
+def test_abandoned_stream_releases_its_slot():
+    sched = scheduler(max_concurrent=1)
+    model = ScheduledModel(MockModel(), sched)
+    response = model.generate_content(["Cycle 2"], stream=True)
+    next(iter(response))
+    del response
+    assert model.generate_content(["Cycle 2"]).text
+    assert sched._active == 0
+
+
+def test_transient_error_mid_stream_restarts_the_response():
+    model = ScheduledModel(FailingMidStream(), scheduler(max_concurrent=1))
+    seen = []
+    text = consume_lines(model.generate_content(["Cycle 2"], stream=True), seen.append)
+    assert text == MockModel().generate_content(["Cycle 2"]).text
+    assert model.scheduler._active == 0
+
+
+def test_full_queue_is_refused():
+    sched = scheduler(max_concurrent=1, max_queue=1)
+    model = ScheduledModel(MockModel(), sched)
+    held = model.generate_content(["Cycle 2"], stream=True)
+    waiting = threading.Thread(target=lambda: model.generate_content(["Cycle 2"]))
+    waiting.start()
+    while not sched.waiting:
+        time.sleep(0.001)
+    with pytest.raises(QueueFull):
+        model.generate_content(["Cycle 2"])
+    held.close()
+    waiting.join()
+
+
+def test_position_is_cleared_once_the_slot_is_taken():
+    sched = scheduler(max_concurrent=1)
+    held = ScheduledModel(MockModel(), sched).generate_content(["Cycle 2"], stream=True)
+    positions = []
+    started = threading.Event()
+
+    def call():
+        started.set()
+        time.sleep(0.05)
+        return "fiche"
+
+    waiting = threading.Thread(target=lambda: sched.run(call, on_position=positions.append))
+    waiting.start()
+    while not sched.waiting:
+        time.sleep(0.001)
+    held.close()
+    started.wait()
+    assert positions == [1, None]
+    waiting.join()
+
+
+class SlowUpload:
+    """Client qui compte ses dépôts de contexte simultanés."""
+
+    def __init__(self):
+        self.active, self.peak, self.lock = 0, 0, threading.Lock()
+
+    def cache_context(self, parts, ttl):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return "cachedContents/livret"
+
+
+def test_context_upload_goes_through_the_scheduler():
+    from adc.context import ContextCache
+    from adc.pipeline import PreparedSource
+
+    client = SlowUpload()
+    contexts = ContextCache(client, min_tokens=0, scheduler=scheduler(max_concurrent=1))
+    sources = [PreparedSource([f"livret {n} " * 200]) for n in range(3)]
+    threads = [threading.Thread(target=contexts.open, args=(source,)) for source in sources]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert client.peak == 1
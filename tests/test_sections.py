@@ -0,0 +1,44 @@
+from adc.models import MOCK_FICHE
+from adc.sections import SECTION_KEYS, has_intro, join_sections, replace_section, section_number, split_sections
+
+FICHE = MOCK_FICHE.replace("{cycle}", "Cycle 2")
+
+
+def test_split_then_join_gives_back_the_fiche():
+    sections = split_sections(FICHE)
+    assert [key for key, _ in sections] == list(SECTION_KEYS)
+    assert join_sections(sections) == FICHE
+
+
+def test_title_followed_by_the_text_name_opens_its_section():
+    assert section_number("## 1. TITRE & INFORMATIONS : « Le Petit Chaperon rouge »") == 1
+
+
+def test_mixed_case_titles_open_sections():
+    assert section_number("## 1. Titre & informations") == 1
+    assert section_number("**3. Deroule en 4 phases**") == 3
+    assert section_number("## 4) Questions-clés", after=3) == 4
+
+
+def test_numbered_question_does_not_open_a_section():
+    assert section_number("5. Que pense l'auteur de ce qui arrive ?", after=4) is None
+    assert section_number("2. OBJECTIFS DE COMPRÉHENSION", after=2) is None
+
+
+def test_mixed_case_fiche_is_split_into_five_sections():
+    text = FICHE.replace("TITRE & INFORMATIONS", "Titre & informations").replace(
+        "POINTS DE VIGILANCE", "Points de vigilance")
+    assert [key for key, _ in split_sections(text)] == list(SECTION_KEYS)
+    assert not has_intro(text)
+
+
+def test_replace_section_keeps_the_other_sections():
+    text = replace_section(FICHE, "vigilance", "## 5. POINTS DE VIGILANCE\n- Nouveau point\n")
+    assert text.count("## 5.") == 1
+    assert "- Nouveau point" in text
+    assert dict(split_sections(text))["questions"] == dict(split_sections(FICHE))["questions"]
+
+
+def test_has_intro():
+    assert has_intro("Voici la fiche.\n\n" + FICHE)
+    assert not has_intro("\n" + FICHE)
@@ -0,0 +1,52 @@
+from adc.models import MOCK_FICHE
+from adc.sections import replace_section
+from adc.validation import section_problems, validate_fiche
+
+FICHE = MOCK_FICHE.replace("{cycle}", "Cycle 2")
+
+QUESTIONS = """## 4. QUESTIONS-CLÉS
+{}
+"""
+
+
+def test_mock_fiche_is_valid():
+    assert validate_fiche(FICHE) == {}
+
+
+def test_missing_section_and_question():
+    text = FICHE.replace("5. Que pense l'auteur de ce qui arrive ?\n", "").split("## 5.")[0]
+    problems = validate_fiche(text)
+    assert problems["vigilance"] == ["section absente"]
+    assert problems["questions"] == ["4 question(s) numérotée(s) au lieu de 5"]
+
+
+def test_bold_and_q_numbered_questions_are_counted():
+    bold = "\n".join(f"**{n}.** Question {n} ?" for n in range(1, 6))
+    prefixed = "\n".join(f"**Q{n}.** Question {n} ?" for n in range(1, 6))
+    colon = "\n".join(f"Q{n} : Question {n} ?" for n in range(1, 6))
+    for body in (bold, prefixed, colon):
+        assert section_problems("questions", QUESTIONS.format(body)) == []
+
+
+def test_italic_line_is_not_an_item():
+    body = "*Questions à poser dans l'ordre*\n" + "\n".join(f"{n}. Question {n} ?" for n in range(1, 6))
+    assert section_problems("questions", QUESTIONS.format(body)) == []
+
+
+def test_phase_2_table_columns_and_missing_phase():
+    text = FICHE.replace("| Ce qu'on sait | Ce qu'on ne sait pas | On n'est pas d'accord |", "| Sait | Ne sait pas |")
+    text = text.replace("### Phase 4 : Retour sur les stratégies de compréhension mobilisées\n", "")
+    problems = validate_fiche(text)["deroule"]
+    assert "phase 4 absente" in problems
+    assert any(problem.startswith("tableau de la phase 2 : colonnes") for problem in problems)
+
+
+def test_empty_section():
+    text = replace_section(FICHE, "vigilance", "## 5. POINTS DE VIGILANCE\n")
+    assert validate_fiche(text) == {"vigilance": ["section vide"]}
+
+
+def test_phase_title_repeating_the_columns_is_not_the_table_header():
+    title = ("**Phase 2 : Tableau collaboratif** — \"Ce qu'on sait\" | \"Ce qu'on ne sait pas\" | "
+             "\"On n'est pas d'accord\"")
+    assert validate_fiche(FICHE.replace("### Phase 2 : Tableau collaboratif", title)) == {}